@@ -0,0 +1,432 @@
+"""گزارش‌گیری و تحلیل نمرات دفاع (برداری با NumPy)"""
+
+import os
+import csv
+import sys
+import json
+import time
+import hashlib
+import argparse
+
+import numpy as np
+
+from main import (
+    DATA_DIR,
+    DEFENSES_FILE,
+    GRADE_CHANGES_FILE,
+    THESES_FILE,
+    load_json,
+    save_json,
+)
+
+COLUMNS_FILE = os.path.join(DATA_DIR, "analytics.npz")
+META_FILE = os.path.join(DATA_DIR, "analytics.json")
+LOG_ROTATE_BYTES = 4 << 20
+
+# هم‌راستا با numeric_to_letter در main.py
+LETTER_EDGES = [10, 13, 17]
+LETTERS = ["د", "ج", "ب", "الف"]
+DIVERGENCE_LIMIT = 4.0
+
+_FLOAT_COLS = ("guide", "internal", "external")
+_INT_COLS = ("id_hash", "thesis", "year", "semester", "professor")
+
+
+def _id_hash(defense_id):
+    return int.from_bytes(
+        hashlib.blake2b(defense_id.encode(), digest_size=8).digest(),
+        "little",
+        signed=True,
+    )
+
+
+def _empty_columns():
+    cols = {c: np.empty(0, dtype=np.float64) for c in _FLOAT_COLS}
+    cols.update({c: np.empty(0, dtype=np.int64) for c in _INT_COLS})
+    return cols
+
+
+def _year(value):
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        return -1
+
+
+class GradeColumns:
+    """کش ستونی نمرات: هر سطر یک دفاعِ نمره‌دار با کلید id_hash"""
+
+    def __init__(self):
+        self.cols = _empty_columns()
+        self.professors = []
+        self.semesters = []
+        self.stamp = None
+        self.log_offset = 0
+
+    def __len__(self):
+        return len(self.cols["guide"])
+
+    def _coder(self, categories):
+        codes = {v: i for i, v in enumerate(categories)}
+
+        def code(value):
+            value = "" if value is None else str(value)
+            if value not in codes:
+                codes[value] = len(categories)
+                categories.append(value)
+            return codes[value]
+
+        return code
+
+    def append_rows(self, rows):
+        """افزودن سطر برای rows: [(defense, thesis)]؛ کدهای دسته‌های قبلی حفظ می‌شوند"""
+        new = {c: [] for c in self.cols}
+        prof_code = self._coder(self.professors)
+        sem_code = self._coder(self.semesters)
+        for d, th in rows:
+            s = d["scores"]
+            new["id_hash"].append(_id_hash(d["id"]))
+            new["thesis"].append(_id_hash(d["thesis_id"]))
+            new["guide"].append(s["guide"])
+            new["internal"].append(s["internal"])
+            new["external"].append(s["external"])
+            th = th or {}
+            new["year"].append(_year(th.get("year")))
+            new["semester"].append(sem_code(th.get("semester")))
+            new["professor"].append(prof_code(th.get("professor_id")))
+        for c, values in new.items():
+            self.cols[c] = np.concatenate(
+                [self.cols[c], np.asarray(values, dtype=self.cols[c].dtype)]
+            )
+
+    def _thesis_of_row(self, thesis_hash):
+        """اطلاعات پایان‌نامه از روی اولین سطر موجود با همان پایان‌نامه (یا None)"""
+        rows = np.flatnonzero(self.cols["thesis"] == thesis_hash)
+        if not len(rows):
+            return None
+        r = rows[0]
+        return {
+            "year": int(self.cols["year"][r]),
+            "semester": self.semesters[self.cols["semester"][r]],
+            "professor_id": self.professors[self.cols["professor"][r]],
+        }
+
+    def upsert(self, defenses, theses):
+        """اعمال تغییرات (آخرین مقدار هر شناسه) روی ستون‌ها
+
+        defenses: {شناسه دفاع: (شناسه پایان‌نامه، [سه نمره])}
+        theses: {شناسه پایان‌نامه: رکورد با year/semester/professor_id}
+        """
+        c = self.cols
+        added = []
+        if defenses:
+            ids = list(defenses)
+            keys = np.array([_id_hash(k) for k in ids], dtype=np.int64)
+            scores = np.array([defenses[k][1] for k in ids], dtype=np.float64)
+            found = np.zeros(len(keys), dtype=bool)
+            if len(self):
+                order = np.argsort(c["id_hash"], kind="stable")
+                pos = np.searchsorted(c["id_hash"], keys, sorter=order)
+                rows = order[np.minimum(pos, len(order) - 1)]
+                found = c["id_hash"][rows] == keys
+                for j, col in enumerate(_FLOAT_COLS):
+                    c[col][rows[found]] = scores[found, j]
+            added = [ids[i] for i in np.flatnonzero(~found)]
+
+        if added:
+            info = {}
+            for did in added:
+                tid = defenses[did][0]
+                if tid not in info:
+                    info[tid] = theses.get(tid) or self._thesis_of_row(_id_hash(tid))
+            if any(v is None for v in info.values()):
+                # پایان‌نامه‌ای که نه در تغییرات هست نه در کش: تنها حالت خواندن theses.json
+                archive = {t["id"]: t for t in load_json(THESES_FILE)}
+                info = {k: v or archive.get(k) for k, v in info.items()}
+            rows = []
+            for did in added:
+                tid, (g1, g2, g3) = defenses[did]
+                scores = {"guide": g1, "internal": g2, "external": g3}
+                d = {"id": did, "thesis_id": tid, "scores": scores}
+                rows.append((d, info[tid]))
+            self.append_rows(rows)
+
+        if theses and len(self):
+            ids = list(theses)
+            keys = np.array([_id_hash(k) for k in ids], dtype=np.int64)
+            idx = np.flatnonzero(np.isin(c["thesis"], keys))
+            if len(idx):
+                prof_code = self._coder(self.professors)
+                sem_code = self._coder(self.semesters)
+                th = [theses[k] for k in ids]
+                years = np.array([_year(t.get("year")) for t in th], dtype=np.int64)
+                sems = np.array(
+                    [sem_code(t.get("semester")) for t in th], dtype=np.int64
+                )
+                profs = np.array(
+                    [prof_code(t.get("professor_id")) for t in th], dtype=np.int64
+                )
+                order = np.argsort(keys, kind="stable")
+                j = order[np.searchsorted(keys, c["thesis"][idx], sorter=order)]
+                c["year"][idx] = years[j]
+                c["semester"][idx] = sems[j]
+                c["professor"][idx] = profs[j]
+
+    def save(self):
+        np.savez(COLUMNS_FILE, **self.cols)
+        save_json(
+            META_FILE,
+            {
+                "professors": self.professors,
+                "semesters": self.semesters,
+                "stamp": self.stamp,
+                "log_offset": self.log_offset,
+            },
+        )
+
+    @classmethod
+    def load(cls):
+        gc = cls()
+        if os.path.exists(COLUMNS_FILE) and os.path.exists(META_FILE):
+            meta = load_json(META_FILE)
+            with np.load(COLUMNS_FILE) as z:
+                cols = {c: z[c] for c in z.files}
+            if set(cols) != set(gc.cols):
+                # کش قدیمی با ستون‌های متفاوت: بازسازی کامل
+                return gc
+            gc.cols = cols
+            gc.professors = meta["professors"]
+            gc.semesters = meta["semesters"]
+            gc.stamp = meta["stamp"]
+            gc.log_offset = meta.get("log_offset", 0)
+        return gc
+
+
+def _source_stamp():
+    stamps = []
+    for p in (DEFENSES_FILE, THESES_FILE):
+        st = os.stat(p) if os.path.exists(p) else None
+        stamps.append([st.st_mtime_ns, st.st_size] if st else None)
+    return stamps
+
+
+def _log_size(path=GRADE_CHANGES_FILE):
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def read_changes(path, start, end):
+    """خطوط کامل لاگ تغییرات در بازه [start, end)؛ خروجی: (دفاع‌ها، پایان‌نامه‌ها، پایان)"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    data = data[: data.rfind(b"\n") + 1]
+    defenses, theses = {}, {}
+    for line in data.splitlines():
+        rec = json.loads(line)
+        if "defense" in rec:
+            defenses[rec["defense"]] = (rec["thesis"], rec["scores"])
+        else:
+            theses[rec["thesis"]] = rec
+    return defenses, theses, start + len(data)
+
+
+def _rebuild(gc):
+    """ساخت کامل ستون‌ها از روی defenses.json و theses.json"""
+    gc.stamp = _source_stamp()
+    gc.log_offset = _log_size()
+    graded = [d for d in load_json(DEFENSES_FILE) if d.get("scores")]
+    theses = {t["id"]: t for t in load_json(THESES_FILE)}
+    gc.cols = _empty_columns()
+    gc.append_rows([(d, theses.get(d["thesis_id"])) for d in graded])
+    gc.save()
+    return gc
+
+
+def refresh(full=False):
+    """بارگذاری کش و اعمال تدریجی تغییرات ثبت‌شده در GRADE_CHANGES_FILE
+
+    main.py هر نمره‌دهی و ویرایش پایان‌نامه را در لاگ تغییرات ثبت می‌کند و فقط
+    همان سطرها (با کلید id_hash) به‌روز می‌شوند. اگر فایل‌های منبع بدون ثبت در
+    لاگ تغییر کرده باشند (ویرایش دستی) یا full=True باشد، ستون‌ها از نو ساخته می‌شوند.
+    """
+    gc = GradeColumns.load()
+    size = _log_size()
+    if full or gc.stamp is None or size < gc.log_offset:
+        return _rebuild(gc)
+    if size == gc.log_offset:
+        if gc.stamp == _source_stamp():
+            return gc
+        return _rebuild(gc)
+
+    defenses, theses, gc.log_offset = read_changes(
+        GRADE_CHANGES_FILE, gc.log_offset, size
+    )
+    if gc.log_offset > LOG_ROTATE_BYTES:
+        # لاگ اعمال‌شده کنار گذاشته می‌شود؛ خطوطی که در این فاصله اضافه شده‌اند هم خوانده می‌شوند
+        old = f"{GRADE_CHANGES_FILE}.{os.getpid()}.old"
+        os.replace(GRADE_CHANGES_FILE, old)
+        more_d, more_t, _ = read_changes(old, gc.log_offset, _log_size(old))
+        defenses.update(more_d)
+        theses.update(more_t)
+        os.remove(old)
+        gc.log_offset = 0
+    gc.upsert(defenses, theses)
+    gc.stamp = _source_stamp()
+    gc.save()
+    return gc
+
+
+
+def letters_of(avg):
+    return np.digitize(avg, LETTER_EDGES)
+
+
+def _group_stats(codes, n_groups, avg, divergence):
+    count = np.bincount(codes, minlength=n_groups)
+    safe = np.where(count > 0, count, 1)
+    mean = np.bincount(codes, weights=avg, minlength=n_groups) / safe
+    sq = np.bincount(codes, weights=avg**2, minlength=n_groups) / safe
+    std = np.sqrt(np.maximum(sq - mean**2, 0.0))
+    div = np.bincount(codes, weights=divergence, minlength=n_groups) / safe
+    return count, mean, std, div
+
+
+def report(gc):
+    """محاسبه همه آمارها روی ستون‌ها"""
+    c = gc.cols
+    scores = np.stack([c["guide"], c["internal"], c["external"]], axis=1)
+    avg = scores.mean(axis=1)
+    divergence = np.ptp(scores, axis=1) if len(avg) else np.empty(0)
+    out = {"count": len(avg)}
+    if not len(avg):
+        return out
+    out["mean"] = float(avg.mean())
+    out["std"] = float(avg.std())
+    out["percentiles"] = dict(
+        zip(
+            ("p10", "p25", "p50", "p75", "p90"),
+            np.percentile(avg, [10, 25, 50, 75, 90]).tolist(),
+        )
+    )
+    out["histogram"] = np.histogram(avg, bins=20, range=(0, 20))[0].tolist()
+    out["letters"] = dict(
+        zip(LETTERS, np.bincount(letters_of(avg), minlength=len(LETTERS)).tolist())
+    )
+    out["divergence"] = {
+        "mean": float(divergence.mean()),
+        "max": float(divergence.max()),
+        "over_limit": int((divergence > DIVERGENCE_LIMIT).sum()),
+        "judge_mean": dict(
+            zip(("guide", "internal", "external"), scores.mean(axis=0).tolist())
+        ),
+    }
+
+    groups = []
+    count, mean, std, div = _group_stats(
+        c["professor"], len(gc.professors), avg, divergence
+    )
+    groups += [
+        ("professor", gc.professors[i], count[i], mean[i], std[i], div[i])
+        for i in np.flatnonzero(count)
+    ]
+    years, inv = np.unique(c["year"], return_inverse=True)
+    count, mean, std, div = _group_stats(inv, len(years), avg, divergence)
+    groups += [
+        ("year", int(years[i]), count[i], mean[i], std[i], div[i])
+        for i in range(len(years))
+    ]
+    count, mean, std, div = _group_stats(
+        c["semester"], len(gc.semesters), avg, divergence
+    )
+    groups += [
+        ("semester", gc.semesters[i], count[i], mean[i], std[i], div[i])
+        for i in np.flatnonzero(count)
+    ]
+    out["groups"] = [
+        {
+            "group": g,
+            "key": k,
+            "count": int(n),
+            "mean": round(float(m), 3),
+            "std": round(float(s), 3),
+            "divergence": round(float(dv), 3),
+        }
+        for g, k, n, m, s, dv in groups
+    ]
+    return out
+
+
+def export_csv(rep, path):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["group", "key", "count", "mean", "std", "divergence"])
+        for g in rep.get("groups", []):
+            w.writerow(
+                [g["group"], g["key"], g["count"], g["mean"], g["std"], g["divergence"]]
+            )
+        for letter, n in rep.get("letters", {}).items():
+            w.writerow(["letter", letter, n, "", "", ""])
+
+
+def print_report(rep, out=sys.stdout):
+    print("تعداد دفاع‌های نمره‌دار:", rep["count"], file=out)
+    if not rep["count"]:
+        return
+    print(f"میانگین: {rep['mean']:.2f}  انحراف معیار: {rep['std']:.2f}", file=out)
+    print(
+        "صدک‌ها:",
+        "  ".join(f"{k}={v:.2f}" for k, v in rep["percentiles"].items()),
+        file=out,
+    )
+    print("توزیع نمرات (بازه‌های یک‌نمره‌ای 0 تا 20):", rep["histogram"], file=out)
+    print(
+        "نمرات حرفی:",
+        "  ".join(f"{k}: {v}" for k, v in rep["letters"].items()),
+        file=out,
+    )
+    dv = rep["divergence"]
+    print(
+        f"اختلاف نمره داوران: میانگین {dv['mean']:.2f}  بیشینه {dv['max']:.2f}"
+        f"  بیش از {DIVERGENCE_LIMIT}: {dv['over_limit']}",
+        file=out,
+    )
+    print(
+        "میانگین هر داور:",
+        "  ".join(f"{k}={v:.2f}" for k, v in dv["judge_mean"].items()),
+        file=out,
+    )
+    for g in rep["groups"]:
+        print(
+            f"{g['group']}\t{g['key']}\tتعداد={g['count']}\tمیانگین={g['mean']}"
+            f"\tانحراف={g['std']}\tاختلاف داوران={g['divergence']}",
+            file=out,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="گزارش نمرات دفاع")
+    parser.add_argument(
+        "--full", action="store_true", help="بازسازی کامل کش از فایل‌های منبع"
+    )
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("report", help="گزارش کامل آرشیو")
+    p.add_argument("--csv", help="ذخیره جدول گروه‌ها در فایل CSV")
+    p = sub.add_parser("export", help="خروجی CSV")
+    p.add_argument("path")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rep = report(refresh(args.full))
+    elapsed = time.perf_counter() - start
+    if args.cmd == "report":
+        print_report(rep)
+        print(f"زمان: {elapsed * 1000:.1f} ms")
+        if args.csv:
+            export_csv(rep, args.csv)
+    elif args.cmd == "export":
+        export_csv(rep, args.path)
+        print("ذخیره شد:", args.path)
+
+
+if __name__ == "__main__":
+    main()
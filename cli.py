@@ -0,0 +1,375 @@
+"""رابط خط فرمان غیرتعاملی سامانه (برای اسکریپت‌ها و اجرای دسته‌ای)
+
+نمونه:
+    python cli.py --json request create --student S1001 --professor P2001 --course T001
+    python cli.py --json batch < commands.txt
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import shlex
+import argparse
+import contextlib
+
+STARTUP_BUDGET_MS = 150
+
+_main = None
+
+
+class CommandError(Exception):
+    """ورودی نامعتبر یا وضعیت نامناسب برای اجرای فرمان"""
+
+
+class _Parser(argparse.ArgumentParser):
+    def error(self, message):
+        raise CommandError(message)
+
+
+def db():
+    """ماژول main؛ import و init_db فقط در اولین استفاده و یک‌بار در هر پردازه"""
+    global _main
+    if _main is None:
+        import main
+
+        main.init_db()
+        _main = main
+    return _main
+
+
+def _get(finder, oid, what):
+    obj = finder(oid)
+    if not obj:
+        raise CommandError(f"{what} با شناسه {oid} پیدا نشد.")
+    return obj
+
+
+def _require_status(obj, status):
+    if obj["status"] != status:
+        raise CommandError(f"وضعیت فعلی {obj['status']} است (انتظار: {status}).")
+
+
+def cmd_request_create(a):
+    m = db()
+    student = m.find_user_by_id(a.student)
+    if not student or student["role"] != "student":
+        raise CommandError("شناسه دانشجو نامعتبر.")
+    prof = m.find_user_by_id(a.professor)
+    if not prof or prof["role"] != "professor":
+        raise CommandError("شناسه استاد نامعتبر.")
+    if not any(c["course_id"] == a.course for c in prof.get("courses", [])):
+        raise CommandError("کد درس نامعتبر.")
+    return m.create_request(a.student, a.professor, a.course)
+
+
+def cmd_request_list(a):
+    m = db()
+    reqs = m.load_json(m.REQUESTS_FILE)
+    return [
+        r
+        for r in reqs
+        if (not a.student or r["student_id"] == a.student)
+        and (not a.professor or r["professor_id"] == a.professor)
+        and (not a.status or r["status"] == a.status)
+    ]
+
+
+def cmd_request_approve(a):
+    m = db()
+    req = _get(m.find_request_by_id, a.id, "درخواست")
+    _require_status(req, "pending")
+    return m.approve_request(req)
+
+
+def cmd_request_reject(a):
+    m = db()
+    req = _get(m.find_request_by_id, a.id, "درخواست")
+    _require_status(req, "pending")
+    return m.reject_request(req, a.reason)
+
+
+def cmd_thesis_submit(a):
+    m = db()
+    req = _get(m.find_request_by_id, a.request, "درخواست")
+    _require_status(req, "approved")
+    try:
+        return m.submit_thesis(
+            req["student_id"],
+            req["professor_id"],
+            a.title,
+            a.abstract,
+            a.keywords,
+            a.pdf,
+            a.year,
+            a.semester,
+        )
+    except FileNotFoundError as e:
+        raise CommandError(str(e))
+
+
+def cmd_thesis_list(a):
+    m = db()
+    return [
+        t
+        for t in m.list_theses()
+        if (not a.student or t["student_id"] == a.student)
+        and (not a.professor or t["professor_id"] == a.professor)
+    ]
+
+
+def cmd_thesis_show(a):
+    m = db()
+    return _get(m.find_thesis_by_id, a.id, "پایان‌نامه")
+
+
+def cmd_defense_request(a):
+    m = db()
+    from datetime import datetime
+
+    th = _get(m.find_thesis_by_id, a.thesis, "پایان‌نامه")
+    allowed_at = m.defense_allowed_at(th)
+    if allowed_at is None:
+        raise CommandError("پیش‌نیاز تایید استاد کامل نیست.")
+    if datetime.utcnow() < allowed_at:
+        raise CommandError(
+            f"حداقل 90 روز از تاریخ تایید نگذشته است (مجاز از {allowed_at.isoformat()})."
+        )
+    try:
+        dt = datetime.fromisoformat(a.date)
+    except ValueError:
+        raise CommandError("فرمت تاریخ نامعتبر.")
+    return m.create_defense_request(th["id"], dt.isoformat(), a.internal, a.external)
+
+
+def cmd_defense_list(a):
+    m = db()
+    if a.professor:
+        defs = m.list_defense_requests_for_prof(a.professor)
+    else:
+        defs = m.load_json(m.DEFENSES_FILE)
+    return [d for d in defs if not a.status or d["status"] == a.status]
+
+
+def cmd_defense_approve(a):
+    m = db()
+    d = _get(m.find_defense_by_id, a.id, "درخواست دفاع")
+    _require_status(d, "pending")
+    return m.approve_defense(d)
+
+
+def cmd_defense_reject(a):
+    m = db()
+    d = _get(m.find_defense_by_id, a.id, "درخواست دفاع")
+    _require_status(d, "pending")
+    return m.reject_defense(d)
+
+
+def cmd_defense_grade(a):
+    m = db()
+    d = _get(m.find_defense_by_id, a.id, "درخواست دفاع")
+    _require_status(d, "approved")
+    for g in (a.guide, a.internal, a.external):
+        if not 0 <= g <= 20:
+            raise CommandError("نمره باید بین 0 و 20 باشد.")
+    th, minutes_path = m.grade_defense(d, a.guide, a.internal, a.external)
+    if not th:
+        raise CommandError("پایان‌نامه مرتبط پیدا نشد.")
+    return {"defense": d, "thesis": th, "minutes_path": minutes_path}
+
+
+def cmd_search(a):
+    return db().search_theses(a.query)
+
+
+def cmd_bench_startup(a):
+    """زمان راه‌اندازی یک پردازه کامل CLI (با init_db و یک فرمان خواندنی)"""
+    argv = [sys.executable, os.path.abspath(__file__), "--json", "request", "list"]
+    argv += ["--student", "-"]
+    import subprocess
+    import statistics
+
+    samples = []
+    for _ in range(a.runs):
+        start = time.perf_counter()
+        subprocess.run(argv, check=True, stdout=subprocess.DEVNULL)
+        samples.append((time.perf_counter() - start) * 1000)
+    median = statistics.median(samples)
+    return {
+        "runs": a.runs,
+        "min_ms": round(min(samples), 1),
+        "median_ms": round(median, 1),
+        "max_ms": round(max(samples), 1),
+        "budget_ms": a.budget,
+        "within_budget": median <= a.budget,
+    }
+
+
+def build_parser():
+    parser = _Parser(prog="cli.py", description="سامانه مدیریت پایان‌نامه (غیرتعاملی)")
+    parser.add_argument("--json", action="store_true", help="خروجی JSON")
+    sub = parser.add_subparsers(dest="group", required=True)
+
+    req = sub.add_parser("request", help="درخواست‌های اخذ پایان‌نامه")
+    rs = req.add_subparsers(dest="action", required=True)
+    p = rs.add_parser("create")
+    p.add_argument("--student", required=True)
+    p.add_argument("--professor", required=True)
+    p.add_argument("--course", required=True)
+    p.set_defaults(func=cmd_request_create)
+    p = rs.add_parser("list")
+    p.add_argument("--student")
+    p.add_argument("--professor")
+    p.add_argument("--status", choices=["pending", "approved", "rejected"])
+    p.set_defaults(func=cmd_request_list)
+    p = rs.add_parser("approve")
+    p.add_argument("id")
+    p.set_defaults(func=cmd_request_approve)
+    p = rs.add_parser("reject")
+    p.add_argument("id")
+    p.add_argument("--reason", default="")
+    p.set_defaults(func=cmd_request_reject)
+
+    th = sub.add_parser("thesis", help="پایان‌نامه‌ها")
+    ts = th.add_subparsers(dest="action", required=True)
+    p = ts.add_parser("submit")
+    p.add_argument("--request", required=True, help="ID درخواست تاییدشده")
+    p.add_argument("--title", required=True)
+    p.add_argument("--abstract", default="")
+    p.add_argument("--keywords", default="", help="با کاما جدا شوند")
+    p.add_argument("--pdf", required=True)
+    p.add_argument("--year", required=True)
+    p.add_argument("--semester", required=True)
+    p.set_defaults(func=cmd_thesis_submit)
+    p = ts.add_parser("list")
+    p.add_argument("--student")
+    p.add_argument("--professor")
+    p.set_defaults(func=cmd_thesis_list)
+    p = ts.add_parser("show")
+    p.add_argument("id")
+    p.set_defaults(func=cmd_thesis_show)
+
+    de = sub.add_parser("defense", help="درخواست‌های دفاع")
+    ds = de.add_subparsers(dest="action", required=True)
+    p = ds.add_parser("request")
+    p.add_argument("--thesis", required=True)
+    p.add_argument("--date", required=True, help="YYYY-MM-DD")
+    p.add_argument("--internal", required=True)
+    p.add_argument("--external", required=True)
+    p.set_defaults(func=cmd_defense_request)
+    p = ds.add_parser("list")
+    p.add_argument("--professor")
+    p.add_argument("--status", choices=["pending", "approved", "rejected"])
+    p.set_defaults(func=cmd_defense_list)
+    p = ds.add_parser("approve")
+    p.add_argument("id")
+    p.set_defaults(func=cmd_defense_approve)
+    p = ds.add_parser("reject")
+    p.add_argument("id")
+    p.set_defaults(func=cmd_defense_reject)
+    p = ds.add_parser("grade")
+    p.add_argument("id")
+    p.add_argument("--guide", type=float, required=True)
+    p.add_argument("--internal", type=float, required=True)
+    p.add_argument("--external", type=float, required=True)
+    p.set_defaults(func=cmd_defense_grade)
+
+    p = sub.add_parser("search", help="جستجوی پایان‌نامه‌ها")
+    p.add_argument("query")
+    p.set_defaults(func=cmd_search)
+
+    p = sub.add_parser("batch", help="اجرای فرمان‌ها از stdin (هر خط یک فرمان)")
+    p.set_defaults(func=None)
+
+    p = sub.add_parser("bench-startup", help="اندازه‌گیری زمان راه‌اندازی")
+    p.add_argument("--runs", type=int, default=20)
+    p.add_argument("--budget", type=float, default=STARTUP_BUDGET_MS, help="ms")
+    p.set_defaults(func=cmd_bench_startup)
+    return parser
+
+
+def _print_human(result, out):
+    items = result if isinstance(result, list) else [result]
+    for item in items:
+        if isinstance(result, list):
+            print("-" * 30, file=out)
+        if isinstance(item, dict):
+            for k, v in item.items():
+                print(f"{k}: {v}", file=out)
+        else:
+            print(item, file=out)
+    if isinstance(result, list) and not result:
+        print("نتیجه‌ای یافت نشد.", file=out)
+
+
+def run_batch(parser, as_json, lines, out=sys.stdout):
+    """اجرای فرمان‌های هر خط در همین پردازه؛ خروجی: تعداد خطاها"""
+    failures = 0
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        # خطای هر خط (حتی غیرمنتظره) فقط همان خط را ناموفق می‌کند
+        try:
+            # متن --help به جای stdout به عنوان نتیجه همان خط برگردانده می‌شود
+            with contextlib.redirect_stdout(io.StringIO()) as buf:
+                try:
+                    args = parser.parse_args(shlex.split(line))
+                except SystemExit as e:
+                    if e.code:
+                        raise CommandError(buf.getvalue().strip() or str(e.code))
+                    args = None
+            if args is None:
+                result = buf.getvalue()
+            elif args.func is None:
+                raise CommandError("batch تودرتو مجاز نیست.")
+            else:
+                result = args.func(args)
+            ok = True
+        except Exception as e:
+            result = str(e) or type(e).__name__
+            if not isinstance(e, CommandError):
+                result = f"{type(e).__name__}: {result}"
+            ok = False
+            failures += 1
+        if as_json:
+            rec = {"line": lineno, "ok": ok}
+            rec["result" if ok else "error"] = result
+            out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        elif ok:
+            _print_human(result, out)
+        else:
+            print(f"خطا (خط {lineno}): {result}", file=out)
+    out.flush()
+    return failures
+
+
+def main(argv=None):
+    parser = build_parser()
+    try:
+        args = parser.parse_args(argv)
+    except CommandError as e:
+        parser.print_usage(sys.stderr)
+        print("خطا:", e, file=sys.stderr)
+        return 2
+
+    if args.func is None:
+        return 1 if run_batch(parser, args.json, sys.stdin) else 0
+
+    try:
+        result = args.func(args)
+    except CommandError as e:
+        print("خطا:", e, file=sys.stderr)
+        return 1
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        _print_human(result, sys.stdout)
+    if isinstance(result, dict) and result.get("within_budget") is False:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,374 @@
+"""سرور دانلود فایل پایان‌نامه‌ها (asyncio + sendfile، پشتیبانی Range و ETag)
+
+مسیر:
+    GET/HEAD /theses/<thesis_id>   فایل پایان‌نامه
+
+فقط فایل‌هایی که در theses.json به یک پایان‌نامه نسبت داده شده‌اند سرو می‌شوند؛
+سایر فایل‌های پوشه files (مانند صورتجلسه‌های نمره) در دسترس نیستند.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import argparse
+import threading
+from email.utils import formatdate
+from urllib.parse import quote, unquote
+
+from main import FILES_DIR, THESES_FILE, load_json, save_json
+
+
+MAX_TRANSFERS = 64
+QUEUE_TIMEOUT = 10.0
+MAX_HEADER = 16 * 1024
+
+_REASONS = {
+    200: "OK",
+    206: "Partial Content",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    416: "Range Not Satisfiable",
+    503: "Service Unavailable",
+}
+_TYPES = {".pdf": "application/pdf", ".txt": "text/plain; charset=utf-8"}
+
+# هش فایل‌ها: (مسیر، mtime، اندازه) -> digest
+_digests = {}
+_theses = {"stamp": None, "by_id": {}}
+
+
+def _thesis_index():
+    """نگاشت شناسه پایان‌نامه به رکورد، تا تغییر بعدی theses.json"""
+    stamp = os.path.getmtime(THESES_FILE) if os.path.exists(THESES_FILE) else None
+    if stamp != _theses["stamp"]:
+        _theses["by_id"] = {t["id"]: t for t in load_json(THESES_FILE)}
+        _theses["stamp"] = stamp
+    return _theses["by_id"]
+
+
+def _resolve(path):
+    """مسیر URL -> (مسیر فایل، digest ثبت‌شده یا None)"""
+    parts = [unquote(p) for p in path.split("?", 1)[0].split("/") if p]
+    if len(parts) != 2:
+        return None, None
+    kind, key = parts
+    if kind != "theses":
+        return None, None
+    th = _thesis_index().get(key)
+    if not th or not th.get("file_path"):
+        return None, None
+    fpath, digest = th["file_path"], th.get("file_digest")
+    root = os.path.realpath(FILES_DIR)
+    fpath = os.path.realpath(fpath)
+    if os.path.dirname(fpath) != root or not os.path.isfile(fpath):
+        return None, None
+    return fpath, digest
+
+
+async def _etag(fpath, st, digest):
+    key = (fpath, st.st_mtime_ns, st.st_size)
+    if key not in _digests:
+        if not digest:
+            import extraction
+
+            loop = asyncio.get_running_loop()
+            digest = await loop.run_in_executor(None, extraction.file_digest, fpath)
+        _digests[key] = digest
+    return f'"{_digests[key]}"'
+
+
+def parse_range(value, size):
+    """هدر Range تکی -> (شروع، پایان) شامل، None برای نادیده گرفتن، یا False اگر خارج از بازه"""
+    if not value or not value.startswith("bytes=") or "," in value:
+        return None
+    start, _, end = value[6:].strip().partition("-")
+    try:
+        if not start:
+            n = int(end)
+            if n <= 0:
+                return False
+            return max(size - n, 0), size - 1
+        start = int(start)
+        end = int(end) if end else None
+    except ValueError:
+        return None
+    if end is not None and end < start:
+        # بازه نحوی نامعتبر؛ طبق RFC 9110 هدر نادیده گرفته می‌شود (200)
+        return None
+    if end is None:
+        end = size - 1
+    if start >= size:
+        return False
+    return start, min(end, size - 1)
+
+
+def _etag_matches(header, etag):
+    tags = [t.strip().removeprefix("W/") for t in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+class DownloadServer:
+    def __init__(self, max_transfers=MAX_TRANSFERS, queue_timeout=QUEUE_TIMEOUT):
+        self.slots = asyncio.Semaphore(max_transfers)
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.served = 0
+        self.bytes_sent = 0
+
+    async def handle(self, reader, writer):
+        try:
+            while await self._one_request(reader, writer):
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.LimitOverrunError:
+            await self._respond(writer, 400, close=True)
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, headers=(), close=False):
+        lines = [f"HTTP/1.1 {status} {_REASONS[status]}"]
+        lines.append(f"Date: {formatdate(usegmt=True)}")
+        lines += [f"{k}: {v}" for k, v in headers]
+        if not any(k == "Content-Length" for k, _ in headers):
+            lines.append("Content-Length: 0")
+        if close:
+            lines.append("Connection: close")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+    async def _one_request(self, reader, writer):
+        raw = await reader.readuntil(b"\r\n\r\n")
+        if len(raw) > MAX_HEADER:
+            await self._respond(writer, 400, close=True)
+            return False
+        lines = raw.decode("latin-1").split("\r\n")
+        try:
+            method, path, version = lines[0].split(" ")
+        except ValueError:
+            await self._respond(writer, 400, close=True)
+            return False
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                k, v = line.split(":", 1)
+                headers[k.strip().lower()] = v.strip()
+        keep_alive = headers.get("connection", "").lower() != "close" and (
+            version == "HTTP/1.1"
+        )
+        close = not keep_alive
+
+        if method not in ("GET", "HEAD"):
+            await self._respond(writer, 405, [("Allow", "GET, HEAD")], close)
+            return keep_alive
+        try:
+            fpath, digest = _resolve(path)
+        except ValueError:
+            # theses.json نیمه‌نوشته یا خراب است؛ کلاینت کمی بعد دوباره بپرسد
+            await self._respond(writer, 503, [("Retry-After", "1")], close)
+            return keep_alive
+        if not fpath:
+            await self._respond(writer, 404, close=close)
+            return keep_alive
+
+        st = os.stat(fpath)
+        etag = await _etag(fpath, st, digest)
+        common = [
+            ("ETag", etag),
+            ("Accept-Ranges", "bytes"),
+            ("Last-Modified", formatdate(st.st_mtime, usegmt=True)),
+        ]
+        inm = headers.get("if-none-match")
+        if inm and _etag_matches(inm, etag):
+            await self._respond(writer, 304, common, close)
+            return keep_alive
+
+        size = st.st_size
+        rng = parse_range(headers.get("range"), size)
+        if_range = headers.get("if-range")
+        if if_range and if_range != etag:
+            rng = None
+        if rng is False:
+            headers_416 = common + [("Content-Range", f"bytes */{size}")]
+            await self._respond(writer, 416, headers_416, close)
+            return keep_alive
+        status, (start, end) = (206, rng) if rng else (200, (0, size - 1))
+        count = end - start + 1
+        name = os.path.basename(fpath)
+        out = common + [
+            (
+                "Content-Type",
+                _TYPES.get(
+                    os.path.splitext(name)[1].lower(), "application/octet-stream"
+                ),
+            ),
+            ("Content-Length", str(count)),
+            ("Content-Disposition", f"attachment; filename*=UTF-8''{quote(name)}"),
+        ]
+        if status == 206:
+            out.append(("Content-Range", f"bytes {start}-{end}/{size}"))
+        if method == "HEAD" or count <= 0:
+            await self._respond(writer, status, out, close)
+            return keep_alive
+
+        try:
+            await asyncio.wait_for(self.slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            await self._respond(writer, 503, [("Retry-After", "5")], close=True)
+            return False
+        self.active += 1
+        try:
+            await self._respond(writer, status, out, close)
+            loop = asyncio.get_running_loop()
+            with open(fpath, "rb") as f:
+                # loop.sendfile روی لینوکس از os.sendfile (بدون کپی در فضای کاربر) استفاده می‌کند
+                sent = await loop.sendfile(writer.transport, f, start, count)
+            self.bytes_sent += sent
+            self.served += 1
+        finally:
+            self.active -= 1
+            self.slots.release()
+        return keep_alive
+
+
+async def serve(host, port, max_transfers=MAX_TRANSFERS, ready=None):
+    app = DownloadServer(max_transfers)
+    server = await asyncio.start_server(app.handle, host, port, limit=MAX_HEADER)
+    if ready is not None:
+        ready(server, app)
+    async with server:
+        await server.serve_forever()
+
+
+async def _fetch(host, port, path, headers=()):
+    """کلاینت ساده برای بنچمارک: (وضعیت، تعداد بایت بدنه)"""
+    reader, writer = await asyncio.open_connection(host, port)
+    req = [f"GET {path} HTTP/1.1", f"Host: {host}", "Connection: close", *headers]
+    writer.write(("\r\n".join(req) + "\r\n\r\n").encode())
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    received = 0
+    while chunk := await reader.read(1 << 20):
+        received += len(chunk)
+    writer.close()
+    return status, received
+
+
+def bench(clients=200, size_mb=64, max_transfers=MAX_TRANSFERS, ranged=0.25):
+    """بنچمارک محلی: دانلود هم‌زمان یک فایل بزرگ توسط تعداد زیادی کلاینت
+
+    در یک پوشه موقت با theses.json جداگانه اجرا می‌شود تا داده‌های اصلی دست نخورند.
+    """
+    import random
+    import shutil
+    import statistics
+
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="download_bench_")
+    os.chdir(workdir)
+    tid = f"bench-{os.getpid()}"
+    fpath = os.path.join(FILES_DIR, f"{tid}.pdf")
+    size = size_mb * 1024 * 1024
+    os.makedirs(os.path.dirname(THESES_FILE), exist_ok=True)
+    os.makedirs(FILES_DIR, exist_ok=True)
+    with open(fpath, "wb") as f:
+        block = os.urandom(1 << 20)
+        for _ in range(size_mb):
+            f.write(block)
+    save_json(THESES_FILE, [{"id": tid, "file_path": fpath}])
+
+    started = threading.Event()
+    holder = {}
+
+    def run_server():
+        loop = asyncio.new_event_loop()
+        holder["loop"] = loop
+
+        def ready(server, app):
+            holder["port"] = server.sockets[0].getsockname()[1]
+            holder["app"] = app
+            started.set()
+
+        try:
+            loop.run_until_complete(serve("127.0.0.1", 0, max_transfers, ready))
+        except asyncio.CancelledError:
+            pass
+
+    th = threading.Thread(target=run_server, daemon=True)
+    th.start()
+    started.wait()
+    port = holder["port"]
+
+    async def one(i):
+        headers = []
+        expected = size
+        if random.random() < ranged:
+            a = random.randrange(size // 2)
+            b = a + random.randrange(1, size // 2)
+            headers.append(f"Range: bytes={a}-{b}")
+            expected = b - a + 1
+        t0 = time.perf_counter()
+        status, got = await _fetch("127.0.0.1", port, f"/theses/{tid}", headers)
+        ok = status in (200, 206) and got == expected
+        return time.perf_counter() - t0, got, ok
+
+    async def run_clients():
+        return await asyncio.gather(*(one(i) for i in range(clients)))
+
+    try:
+        t0 = time.perf_counter()
+        results = asyncio.run(run_clients())
+        elapsed = time.perf_counter() - t0
+    finally:
+        for task in asyncio.all_tasks(holder["loop"]):
+            holder["loop"].call_soon_threadsafe(task.cancel)
+        th.join(timeout=5)
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    lat = sorted(r[0] for r in results)
+    total = sum(r[1] for r in results)
+    return {
+        "clients": clients,
+        "file_mb": size_mb,
+        "max_transfers": max_transfers,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_mb_s": round(total / elapsed / 1e6, 1),
+        "p50_s": round(statistics.median(lat), 3),
+        "p95_s": round(lat[int(len(lat) * 0.95) - 1], 3),
+        "max_s": round(lat[-1], 3),
+        "errors": sum(1 for r in results if not r[2]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="سرور دانلود فایل پایان‌نامه‌ها")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("serve")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8080)
+    p.add_argument("--max-transfers", type=int, default=MAX_TRANSFERS)
+    p = sub.add_parser("bench", help="بنچمارک دانلود هم‌زمان")
+    p.add_argument("--clients", type=int, default=200)
+    p.add_argument("--size-mb", type=int, default=64)
+    p.add_argument("--max-transfers", type=int, default=MAX_TRANSFERS)
+    args = parser.parse_args()
+
+    if args.cmd == "serve":
+        print(f"http://{args.host}:{args.port}/theses/<id>", file=sys.stderr)
+        try:
+            asyncio.run(serve(args.host, args.port, args.max_transfers))
+        except KeyboardInterrupt:
+            pass
+    elif args.cmd == "bench":
+        for k, v in bench(args.clients, args.size_mb, args.max_transfers).items():
+            print(f"{k}: {v}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+"""استخراج متن فایل‌های PDF پایان‌نامه در پس‌زمینه"""
+
+import os
+import re
+import sys
+import time
+import json
+import zlib
+import atexit
+import hashlib
+import logging
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from main import DATA_DIR, THESES_FILE, load_json, merge_thesis_fields
+
+
+TEXT_CACHE_DIR = os.path.join(DATA_DIR, "text_cache")
+# نتایج شباهتی که کار پس‌زمینه دوباره محاسبه کرده (هر خط یک JSON، آخرین خط معتبر)
+UPDATES_FILE = os.path.join(DATA_DIR, "similar_updates.jsonl")
+
+# دیکشنری خود stream (بدون عبور از endobj اشیای قبلی) و بدنه آن
+_STREAM_RE = re.compile(
+    rb"\d+\s+\d+\s+obj\s*(<<(?:(?!endobj).)*?>>)\s*stream\r?\n(.*?)endstream", re.S
+)
+_IMAGE_RE = re.compile(rb"/Subtype\s*/Image\b")
+_DELIMS = b"()<>[]{}/% \t\r\n\f\x00"
+_ESCAPES = {
+    ord("n"): b"\n",
+    ord("r"): b"\r",
+    ord("t"): b"\t",
+    ord("b"): b"\b",
+    ord("f"): b"\f",
+}
+_NEWLINE_OPS = {b"T*", b"Td", b"TD", b"ET"}
+
+_pool = None
+_pool_lock = threading.Lock()
+_updates = {"key": None, "by_id": {}}
+
+log = logging.getLogger(__name__)
+
+
+def file_digest(path):
+    """هش sha256 محتوای فایل"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cache_path(digest):
+    return os.path.join(TEXT_CACHE_DIR, digest + ".txt")
+
+
+def cached_text(digest):
+    """متن استخراج‌شده از کش (یا رشته خالی)"""
+    if not digest:
+        return ""
+    path = cache_path(digest)
+    if not os.path.exists(path):
+        return ""
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def thesis_text(thesis):
+    return cached_text(thesis.get("file_digest"))
+
+
+def _read_literal(data, i):
+    """خواندن رشته (...) از موقعیت i؛ خروجی: (بایت‌ها، موقعیت بعدی)"""
+    out = bytearray()
+    depth = 1
+    i += 1
+    n = len(data)
+    while i < n:
+        c = data[i]
+        if c == 0x5C:  # backslash
+            i += 1
+            if i >= n:
+                break
+            c = data[i]
+            if c in _ESCAPES:
+                out += _ESCAPES[c]
+            elif 0x30 <= c <= 0x37:
+                j = i
+                while j < n and j < i + 3 and 0x30 <= data[j] <= 0x37:
+                    j += 1
+                out.append(int(data[i:j], 8) & 0xFF)
+                i = j - 1
+            elif c in (0x0D, 0x0A):
+                if c == 0x0D and i + 1 < n and data[i + 1] == 0x0A:
+                    i += 1
+            else:
+                out.append(c)
+        elif c == 0x28:
+            depth += 1
+            out.append(c)
+        elif c == 0x29:
+            depth -= 1
+            if depth == 0:
+                return bytes(out), i + 1
+            out.append(c)
+        else:
+            out.append(c)
+        i += 1
+    return bytes(out), i
+
+
+def _decode_string(raw):
+    if raw.startswith(b"\xfe\xff"):
+        return raw[2:].decode("utf-16-be", errors="ignore")
+    return raw.decode("latin-1")
+
+
+def content_text(data):
+    """استخراج متن از عملگرهای Tj/TJ/'/\" یک content stream"""
+    parts = []
+    operands = []
+    i = 0
+    n = len(data)
+    while i < n:
+        c = data[i]
+        if c in b" \t\r\n\f\x00":
+            i += 1
+        elif c == 0x25:  # comment
+            while i < n and data[i] not in b"\r\n":
+                i += 1
+        elif c == 0x28:
+            raw, i = _read_literal(data, i)
+            operands.append(raw)
+        elif c == 0x3C and data[i + 1 : i + 2] != b"<":
+            j = data.find(b">", i)
+            if j < 0:
+                break
+            hexstr = re.sub(rb"\s", b"", data[i + 1 : j])
+            if len(hexstr) % 2:
+                hexstr += b"0"
+            try:
+                operands.append(bytes.fromhex(hexstr.decode("ascii")))
+            except ValueError:
+                pass
+            i = j + 1
+        elif c in b"[]<>{}":
+            if c == 0x5B:
+                operands.append(b"[")
+            i += 2 if data[i : i + 2] in (b"<<", b">>") else 1
+        else:
+            j = i + 1
+            while j < n and data[j] not in _DELIMS:
+                j += 1
+            token = data[i:j]
+            i = j
+            if c == 0x2F:  # name
+                continue
+            try:
+                operands.append(float(token))
+                continue
+            except ValueError:
+                pass
+            if token in (b"Tj", b"'", b'"', b"TJ"):
+                if token in (b"'", b'"'):
+                    parts.append("\n")
+                for op in operands:
+                    if isinstance(op, bytes) and op != b"[":
+                        parts.append(_decode_string(op))
+                    elif isinstance(op, float) and op < -200:
+                        parts.append(" ")
+            elif token in _NEWLINE_OPS:
+                parts.append("\n")
+            operands = []
+    text = "".join(parts)
+    return "\n".join(" ".join(line.split()) for line in text.splitlines() if line.strip())
+
+
+def pdf_text(path):
+    """متن ساده فایل PDF با باز کردن stream‌های Flate"""
+    with open(path, "rb") as f:
+        raw = f.read()
+    chunks = []
+    for m in _STREAM_RE.finditer(raw):
+        header, body = m.group(1), m.group(2)
+        if b"/Filter" in header:
+            if b"/FlateDecode" not in header or _IMAGE_RE.search(header):
+                continue
+            try:
+                body = zlib.decompressobj().decompress(body)
+            except zlib.error:
+                continue
+        if b"BT" not in body:
+            continue
+        text = content_text(body)
+        if text:
+            chunks.append(text)
+    return "\n".join(chunks)
+
+
+def extract_file(path, digest=None):
+    """استخراج و ذخیره متن در کش؛ خروجی: (digest، تعداد بایت، از کش بود؟)"""
+    size = os.path.getsize(path)
+    digest = digest or file_digest(path)
+    dest = cache_path(digest)
+    if os.path.exists(dest):
+        return digest, size, True
+    os.makedirs(TEXT_CACHE_DIR, exist_ok=True)
+    text = pdf_text(path)
+    tmp = f"{dest}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, dest)
+    return digest, size, False
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=2)
+            atexit.register(_pool.shutdown, wait=True)
+        return _pool
+
+
+def drain():
+    """منتظر ماندن برای پایان استخراج‌های در جریان"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+
+
+def similarity_updates():
+    """شناسه پایان‌نامه -> آخرین فهرست مشابه‌های محاسبه‌شده در پس‌زمینه"""
+    try:
+        st = os.stat(UPDATES_FILE)
+    except FileNotFoundError:
+        return {}
+    key = (st.st_ino, st.st_size, st.st_mtime_ns)
+    if key != _updates["key"]:
+        by_id = {}
+        with open(UPDATES_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                # خط نیمه‌کاره (در حال نوشتن) نادیده گرفته می‌شود
+                if line.endswith("\n"):
+                    rec = json.loads(line)
+                    by_id[rec["id"]] = rec["similar_theses"]
+        _updates.update(key=key, by_id=by_id)
+    return _updates["by_id"]
+
+
+def merge_updates(theses):
+    """اعمال نتایج پس‌زمینه روی رکوردهای خوانده‌شده از theses.json (در زمان خواندن)"""
+    updates = similarity_updates()
+    if updates:
+        for t in theses:
+            if t["id"] in updates:
+                t["similar_theses"] = updates[t["id"]]
+    return theses
+
+
+def drop_updates(ids=None):
+    """حذف نتایج پس‌زمینه‌ای که در theses.json ادغام شده‌اند (None: همه)"""
+    if not os.path.exists(UPDATES_FILE):
+        return
+    if ids is None:
+        os.remove(UPDATES_FILE)
+        return
+    ids = set(ids)
+    kept = {k: v for k, v in similarity_updates().items() if k not in ids}
+    tmp = f"{UPDATES_FILE}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for tid, matches in kept.items():
+            rec = {"id": tid, "similar_theses": matches}
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    os.replace(tmp, UPDATES_FILE)
+
+
+def index_thesis(thesis):
+    """کار پس‌زمینه: استخراج متن و (در صورت نیاز) امضای مجدد شباهت با متن کامل
+
+    theses.json اینجا نوشته نمی‌شود؛ نتیجه جدید (اگر تغییر کرده باشد) در
+    UPDATES_FILE اضافه و هنگام خواندن پایان‌نامه‌ها ادغام می‌شود.
+    """
+    import similarity
+
+    digest, _, _ = extract_file(thesis["file_path"], thesis.get("file_digest"))
+    if not cached_text(digest) or similarity.load_index().full.get(thesis["id"]):
+        return
+    matches = similarity.check_and_index(dict(thesis, file_digest=digest))
+    if matches != thesis.get("similar_theses"):
+        rec = {"id": thesis["id"], "similar_theses": matches}
+        with open(UPDATES_FILE, "ab") as f:
+            f.write((json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8"))
+
+
+def _log_failure(tid, fut):
+    err = None if fut.cancelled() else fut.exception()
+    if err is not None:
+        log.error("background indexing failed for thesis %s", tid, exc_info=err)
+
+
+def enqueue(thesis):
+    """شروع استخراج و امضای مجدد در پس‌زمینه (بدون انتظار)
+
+    صف پایدار وجود ندارد: اگر کار انجام نشود، backfill فایل‌هایی را که در کش
+    نیستند دوباره پیدا می‌کند.
+    """
+    try:
+        fut = _get_pool().submit(index_thesis, thesis)
+    except RuntimeError:
+        return
+    fut.add_done_callback(lambda f: _log_failure(thesis["id"], f))
+
+
+def backfill(workers=None, out=sys.stdout):
+    """استخراج متن همه فایل‌های آرشیو که هنوز در کش نیستند"""
+    theses = load_json(THESES_FILE)
+    digests = {}
+    jobs = {}
+    for t in theses:
+        path = t.get("file_path")
+        if not path or not os.path.exists(path):
+            continue
+        if not t.get("file_digest"):
+            t["file_digest"] = file_digest(path)
+            digests[t["id"]] = {"file_digest": t["file_digest"]}
+        jobs.setdefault(t["file_digest"], path)
+    # فقط فیلدهای محاسبه‌شده در نسخه فعلی theses.json ادغام می‌شوند
+    if digests:
+        merge_thesis_fields(digests)
+
+    total = len(jobs)
+    done = cached = nbytes = 0
+    fresh = set()
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(extract_file, p, d) for d, p in jobs.items()]
+        for fut in as_completed(futures):
+            digest, size, hit = fut.result()
+            done += 1
+            if hit:
+                cached += 1
+            else:
+                nbytes += size
+                fresh.add(digest)
+            elapsed = max(time.perf_counter() - start, 1e-9)
+            print(
+                f"\r[{done}/{total}] {done / elapsed:.1f} فایل/ثانیه"
+                f" {nbytes / elapsed / 1e6:.2f} MB/s (کش: {cached})",
+                end="",
+                file=out,
+            )
+    print(file=out)
+
+    # امضای مجدد پایان‌نامه‌هایی که متن دارند ولی امضایشان بدون متن PDF ساخته شده
+    import similarity
+
+    full = similarity.load_index().full
+    sigs = {}
+    for t in theses:
+        if full.get(t["id"]) or not similarity.has_full_text(t):
+            continue
+        sig = similarity.thesis_signature(t)
+        if sig is not None:
+            sigs[t["id"]] = sig
+            similarity.store_signature(t["id"], sig, True)
+    # پرس‌وجو پس از ثبت همه امضاها تا ترتیب پردازش در نتیجه اثر نگذارد
+    index = similarity.load_index()
+    updates = {
+        tid: {"similar_theses": index.query(sig, exclude=tid)}
+        for tid, sig in sigs.items()
+    }
+    resigned = len(sigs)
+    if resigned:
+        merge_thesis_fields(updates)
+        drop_updates(sigs)
+    return {
+        "total": total,
+        "extracted": len(fresh),
+        "cached": cached,
+        "resigned": resigned,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="استخراج متن PDF پایان‌نامه‌ها")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("backfill", help="استخراج متن کل آرشیو")
+    p.add_argument("--workers", type=int, default=None)
+    p = sub.add_parser("show", help="نمایش متن یک فایل PDF")
+    p.add_argument("path")
+    args = parser.parse_args()
+
+    if args.cmd == "backfill":
+        stats = backfill(args.workers)
+        print(
+            "تعداد کل:", stats["total"],
+            "استخراج‌شده:", stats["extracted"],
+            "از کش:", stats["cached"],
+            "امضای مجدد:", stats["resigned"],
+        )
+    elif args.cmd == "show":
+        print(pdf_text(args.path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,558 @@
+"""شبیه‌ساز بار هم‌زمان برای کل چرخه پایان‌نامه
+
+هر دانشجوی مجازی: درخواست اخذ ← (تایید استاد) ← ثبت پایان‌نامه ← درخواست دفاع
+← (تایید و نمره استاد و صورت‌جلسه). دانشجوها و اساتید نخ‌های جدا هستند و
+مستقیماً توابع main.py را صدا می‌زنند. اجرا در یک پوشه موقت انجام می‌شود و
+پس از پایان، سازگاری داده‌ها (به‌روزرسانی‌های گم‌شده، فایل خراب و ...) و
+ایندکس‌های جانبی (شباهت، TF-IDF، کش متن) با theses.json بررسی می‌شود.
+
+نمونه:
+    python loadsim.py --students 200 --professors 10 --rate 20 --think 0.05
+    python loadsim.py --serialize   # همه عملیات پشت یک قفل سراسری
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import random
+import shutil
+import tempfile
+import argparse
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class InstrumentedLock:
+    """قفل سراسری که زمان انتظار برای گرفتن آن را ثبت می‌کند"""
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.acquisitions = 0
+        self.contended = 0
+        self.waits = []
+
+    def __enter__(self):
+        if not self.enabled:
+            return self
+        if self._lock.acquire(blocking=False):
+            wait = 0.0
+        else:
+            t0 = time.perf_counter()
+            self._lock.acquire()
+            wait = time.perf_counter() - t0
+        with self._stats_lock:
+            self.acquisitions += 1
+            if wait:
+                self.contended += 1
+                self.waits.append(wait)
+        return self
+
+    def __exit__(self, *exc):
+        if self.enabled:
+            self._lock.release()
+
+
+class Recorder:
+    """جمع‌آوری زمان عملیات‌ها و خطاها (امن برای نخ‌ها)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_samples = []
+
+    def call(self, lock, name, fn, *args):
+        t0 = time.perf_counter()
+        try:
+            with lock:
+                return fn(*args)
+        except Exception as e:
+            key = f"{name}: {type(e).__name__}"
+            with self._lock:
+                self.errors[key] += 1
+                if len(self.error_samples) < 10:
+                    self.error_samples.append(f"{key}: {e}")
+            return None
+        finally:
+            with self._lock:
+                self.latency[name].append(time.perf_counter() - t0)
+
+    def record(self, name, seconds):
+        with self._lock:
+            self.latency[name].append(seconds)
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    s = sorted(samples)
+
+    def pick(q):
+        return round(s[min(len(s) - 1, int(q * len(s)))] * 1000, 2)
+
+    return {
+        "count": len(s),
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": round(s[-1] * 1000, 2),
+    }
+
+
+def seed_users(m, n_students, n_professors):
+    """ساخت کاربران مجازی (یک هش رمز مشترک برای سرعت)"""
+    pw = m.make_password_hash("load123")
+    users = m.load_json(m.USERS_FILE)
+    profs = []
+    for i in range(n_professors):
+        pid = f"LP{i:04d}"
+        users.append(
+            {
+                "id": pid,
+                "role": "professor",
+                "name": f"استاد {i}",
+                "password": pw,
+                "email": f"{pid}@example.com",
+                "courses": [{"course_id": f"LC{i:04d}", "title": "پایان‌نامه"}],
+                "max_supervise": n_students,
+                "current_supervise": 0,
+            }
+        )
+        profs.append((pid, f"LC{i:04d}"))
+    students = [f"LS{i:05d}" for i in range(n_students)]
+    for sid in students:
+        users.append(
+            {
+                "id": sid,
+                "role": "student",
+                "name": sid,
+                "password": pw,
+                "email": f"{sid}@example.com",
+            }
+        )
+    m.save_json(m.USERS_FILE, users)
+    return students, profs
+
+
+def write_sample_pdf(path, text):
+    import zlib
+
+    content = b"BT /F1 12 Tf 72 700 Td (" + text.encode("ascii") + b") Tj ET"
+    comp = zlib.compress(content)
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n1 0 obj\n<< /Length " + str(len(comp)).encode())
+        f.write(b" /Filter /FlateDecode >>\nstream\n" + comp)
+        f.write(b"\nendstream\nendobj\n%%EOF\n")
+
+
+TOPICS = [
+    "یادگیری عمیق تشخیص چهره",
+    "مسیریابی شبکه حسگر بی سیم",
+    "پایگاه داده توزیع شده",
+    "امنیت وب و تشخیص نفوذ",
+    "پردازش زبان طبیعی فارسی",
+    "رایانش ابری و مجازی سازی",
+]
+
+# واژگان متن PDF؛ هر دانشجو متن متفاوتی می‌سازد تا استخراج و شباهت واقعاً اجرا شوند
+WORDS = (
+    "model network data system learning security cloud query index graph "
+    "sensor routing attack feature training cluster storage latency language "
+    "parser kernel cache shard replica protocol vector image signal energy"
+).split()
+
+
+class Simulation:
+    def __init__(self, m, args):
+        self.m = m
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.rng_lock = threading.Lock()
+        self.lock = InstrumentedLock(args.serialize)
+        self.rec = Recorder()
+        self.inboxes = {}
+        self.expected = {"requests": {}, "theses": {}, "defenses": {}}
+        self.exp_lock = threading.Lock()
+        self.stop = threading.Event()
+        self.timeouts = 0
+
+    def think(self):
+        if self.args.think > 0:
+            with self.rng_lock:
+                t = self.rng.expovariate(1.0 / self.args.think)
+            time.sleep(t)
+
+    def expect(self, kind, key, value):
+        with self.exp_lock:
+            self.expected[kind][key] = value
+
+    # ---- اساتید ----
+    def professor(self, pid):
+        m, rec, lock = self.m, self.rec, self.lock
+        inbox = self.inboxes[pid]
+        while not (self.stop.is_set() and inbox.empty()):
+            try:
+                kind, oid, done, grades = inbox.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            self.think()
+            if kind == "request":
+                req = rec.call(lock, "find_request", m.find_request_by_id, oid)
+                if req and rec.call(lock, "approve_request", m.approve_request, req):
+                    self.expect("requests", oid, "approved")
+            elif kind == "defense":
+                d = rec.call(lock, "find_defense", m.find_defense_by_id, oid)
+                if d and rec.call(lock, "approve_defense", m.approve_defense, d):
+                    self.think()
+                    graded = rec.call(
+                        lock, "grade_defense", m.grade_defense, d, *grades
+                    )
+                    if graded and graded[0]:
+                        avg = sum(grades) / 3.0
+                        letter = m.numeric_to_letter(avg)
+                        self.expect("theses", d["thesis_id"], (round(avg, 2), letter))
+                        self.expect("defenses", oid, grades)
+            done.set()
+
+    # ---- دانشجوها ----
+    def student(self, sid, pid, course_id, workdir):
+        m, rec, lock = self.m, self.rec, self.lock
+        t_start = time.perf_counter()
+        req = rec.call(lock, "create_request", m.create_request, sid, pid, course_id)
+        if not req:
+            return False
+        self.expect("requests", req["id"], "pending")
+        if not self._wait_for(pid, "request", req["id"]):
+            return False
+
+        self.think()
+        with self.rng_lock:
+            topic = self.rng.choice(TOPICS)
+            grades = tuple(round(self.rng.uniform(8, 20), 2) for _ in range(3))
+            year = str(self.rng.choice(range(1398, 1405)))
+            words = [self.rng.choice(WORDS) for _ in range(60)]
+        pdf_path = os.path.join(workdir, f"{sid}.pdf")
+        write_sample_pdf(pdf_path, f"thesis {sid} " + " ".join(words))
+        th = rec.call(
+            lock,
+            "submit_thesis",
+            m.submit_thesis,
+            sid,
+            pid,
+            f"{topic} {sid}",
+            f"چکیده پایان‌نامه درباره {topic}",
+            topic.replace(" ", ","),
+            pdf_path,
+            year,
+            "اول",
+        )
+        if not th:
+            return False
+        self.expect("theses", th["id"], (None, None))
+        self.think()
+        d = rec.call(
+            lock,
+            "create_defense_request",
+            m.create_defense_request,
+            th["id"],
+            "2026-01-01T00:00:00",
+            "داور داخلی",
+            "داور خارجی",
+        )
+        if not d:
+            return False
+        self.expect("defenses", d["id"], None)
+        if not self._wait_for(pid, "defense", d["id"], grades):
+            return False
+        if self.expected["defenses"][d["id"]] is None:
+            return False
+        rec.record("session", time.perf_counter() - t_start)
+        return True
+
+    def _wait_for(self, pid, kind, oid, grades=None):
+        done = threading.Event()
+        self.inboxes[pid].put((kind, oid, done, grades))
+        if done.wait(self.args.timeout):
+            return True
+        with self.exp_lock:
+            self.timeouts += 1
+        return False
+
+    def run(self, students, profs, workdir):
+        for pid, _ in profs:
+            self.inboxes[pid] = queue.Queue()
+        prof_threads = [
+            threading.Thread(target=self.professor, args=(pid,), daemon=True)
+            for pid, _ in profs
+        ]
+        for t in prof_threads:
+            t.start()
+
+        t0 = time.perf_counter()
+        futures = []
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as pool:
+            for sid in students:
+                with self.rng_lock:
+                    pid, course_id = self.rng.choice(profs)
+                    gap = self.rng.expovariate(self.args.rate) if self.args.rate else 0
+                futures.append(pool.submit(self.student, sid, pid, course_id, workdir))
+                # ورود دانشجوها طبق فرایند پواسون با نرخ rate در ثانیه
+                time.sleep(gap)
+        elapsed = time.perf_counter() - t0
+        self.stop.set()
+        for t in prof_threads:
+            t.join()
+        completed = sum(1 for f in futures if f.result())
+        return elapsed, completed
+
+
+def check_consistency(m, sim):
+    """بررسی داده‌ها پس از اجرا در برابر نتایج مورد انتظار"""
+    out = {"corrupt_files": [], "lost": defaultdict(int), "stale": defaultdict(int)}
+    data = {}
+    for name, path in (
+        ("requests", m.REQUESTS_FILE),
+        ("theses", m.THESES_FILE),
+        ("defenses", m.DEFENSES_FILE),
+        ("users", m.USERS_FILE),
+    ):
+        try:
+            data[name] = m.load_json(path)
+        except (ValueError, OSError) as e:
+            out["corrupt_files"].append(f"{path}: {e}")
+            data[name] = []
+
+    for name in ("requests", "theses", "defenses"):
+        ids = [r["id"] for r in data[name]]
+        out[f"duplicate_{name}"] = len(ids) - len(set(ids))
+    reqs = {r["id"]: r for r in data["requests"]}
+    theses = {t["id"]: t for t in data["theses"]}
+    defs = {d["id"]: d for d in data["defenses"]}
+
+    for rid, status in sim.expected["requests"].items():
+        if rid not in reqs:
+            out["lost"]["requests"] += 1
+        elif reqs[rid]["status"] != status:
+            out["stale"]["requests"] += 1
+    for tid, (numeric, letter) in sim.expected["theses"].items():
+        th = theses.get(tid)
+        if th is None:
+            out["lost"]["theses"] += 1
+            continue
+        if th.get("grade_numeric") != numeric or th.get("grade_letter") != letter:
+            out["stale"]["theses"] += 1
+        minutes = os.path.join(m.FILES_DIR, f"minutes_{tid}.txt")
+        if numeric is not None and not os.path.exists(minutes):
+            out["lost"]["minutes"] += 1
+        if not os.path.exists(th["file_path"]):
+            out["lost"]["files"] += 1
+    for did, grades in sim.expected["defenses"].items():
+        d = defs.get(did)
+        if d is None:
+            out["lost"]["defenses"] += 1
+            continue
+        if grades is None:
+            continue
+        s = d.get("scores") or {}
+        scores = (s.get("guide"), s.get("internal"), s.get("external"))
+        if d["status"] != "approved" or scores != grades:
+            out["stale"]["defenses"] += 1
+    out["lost"] = dict(out["lost"])
+    out["stale"] = dict(out["stale"])
+    out["indexes"] = check_indexes(data["theses"])
+    return out
+
+
+def check_indexes(theses):
+    """سازگاری ایندکس‌های جانبی (شباهت، TF-IDF، کش متن) با theses.json"""
+    import extraction
+    import recommend
+    import similarity
+
+    out = {"corrupt": [], "orphan": defaultdict(int), "missing": defaultdict(int)}
+    ids = {t["id"] for t in theses}
+
+    path = similarity.BUCKETS_FILE
+    if os.path.exists(path) and os.path.getsize(path) % similarity.RECORD.itemsize:
+        out["corrupt"].append(f"{path}: رکورد نیمه‌کاره")
+    try:
+        index = similarity.load_index()
+    except (ValueError, OSError) as e:
+        out["corrupt"].append(f"{path}: {e}")
+    else:
+        indexed = set(index.keys)
+        out["orphan"]["minhash"] = len(indexed - ids)
+        out["missing"]["minhash"] = sum(
+            1
+            for t in theses
+            if t["id"] not in indexed and similarity.thesis_signature(t) is not None
+        )
+        out["missing"]["minhash_signatures"] = sum(
+            1 for tid in indexed if similarity.read_signature(tid) is None
+        )
+
+    if theses:
+        try:
+            model = recommend.load_model()
+        except (ValueError, KeyError, OSError) as e:
+            out["corrupt"].append(f"{recommend.MATRIX_FILE}: {e}")
+        else:
+            terms = defaultdict(int)
+            for t in theses:
+                terms[t["professor_id"]] += len(recommend.thesis_terms(t))
+            profs = {p for p, n in terms.items() if n}
+            out["orphan"]["tfidf"] = len(set(model.professors) - profs)
+            out["missing"]["tfidf"] = len(profs - set(model.professors))
+            # شمارش کل واژه‌ها به‌روزرسانی‌های گم‌شده یا تکراری را هم نشان می‌دهد
+            if int(model.counts.sum()) != sum(terms.values()):
+                out["corrupt"].append(
+                    f"{recommend.MATRIX_FILE}: {int(model.counts.sum())} واژه"
+                    f" (انتظار: {sum(terms.values())})"
+                )
+
+    out["missing"]["text_cache"] = sum(
+        1
+        for t in theses
+        if t.get("file_digest")
+        and not os.path.exists(extraction.cache_path(t["file_digest"]))
+    )
+    out["orphan"] = {k: v for k, v in out["orphan"].items() if v}
+    out["missing"] = {k: v for k, v in out["missing"].items() if v}
+    return out
+
+
+def simulate(args):
+    workdir = tempfile.mkdtemp(prefix="loadsim_")
+    cwd = os.getcwd()
+    # مسیرهای main.py نسبی‌اند؛ اجرا در پوشه موقت داده‌های واقعی را دست نمی‌زند
+    os.chdir(workdir)
+    try:
+        import main as m
+
+        m.init_db()
+        students, profs = seed_users(m, args.students, args.professors)
+
+        sim = Simulation(m, args)
+        elapsed, completed = sim.run(students, profs, workdir)
+        import extraction
+
+        extraction.drain()
+        report = {
+            "students": args.students,
+            "professors": args.professors,
+            "concurrency": args.concurrency,
+            "serialized": args.serialize,
+            "elapsed_s": round(elapsed, 2),
+            "completed_sessions": completed,
+            "sessions_per_s": round(completed / elapsed, 2) if elapsed else 0,
+            "ops_per_s": (
+                round(
+                    sum(len(v) for k, v in sim.rec.latency.items() if k != "session")
+                    / elapsed,
+                    1,
+                )
+                if elapsed
+                else 0
+            ),
+            "timeouts": sim.timeouts,
+            "latency": {k: percentiles(v) for k, v in sorted(sim.rec.latency.items())},
+            "errors": dict(sim.rec.errors),
+            "error_samples": sim.rec.error_samples,
+            "lock": {
+                "acquisitions": sim.lock.acquisitions,
+                "contended": sim.lock.contended,
+                "wait": percentiles(sim.lock.waits),
+                "total_wait_s": round(sum(sim.lock.waits), 3),
+            },
+            "consistency": check_consistency(m, sim),
+        }
+    finally:
+        os.chdir(cwd)
+        if args.keep:
+            print("پوشه داده‌های شبیه‌سازی:", workdir, file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def print_report(r):
+    print(
+        f"دانشجو: {r['students']}  استاد: {r['professors']}"
+        f"  هم‌زمانی: {r['concurrency']}  قفل سراسری: {r['serialized']}"
+    )
+    print(
+        f"زمان: {r['elapsed_s']} s  جلسات کامل: {r['completed_sessions']}"
+        f"  ({r['sessions_per_s']}/s)  عملیات: {r['ops_per_s']}/s"
+        f"  timeout: {r['timeouts']}"
+    )
+    print("تاخیر عملیات‌ها:")
+    for name, p in r["latency"].items():
+        print(
+            f"  {name:24s} n={p['count']:<6d} p50={p['p50_ms']}ms"
+            f" p95={p['p95_ms']}ms p99={p['p99_ms']}ms max={p['max_ms']}ms"
+        )
+    lock = r["lock"]
+    if r["serialized"]:
+        print(
+            f"قفل: {lock['acquisitions']} بار، {lock['contended']} بار با انتظار،"
+            f" مجموع انتظار {lock['total_wait_s']} s {lock['wait']}"
+        )
+    if r["errors"]:
+        print("خطاها:", r["errors"])
+        for s in r["error_samples"]:
+            print("  ", s)
+    c = r["consistency"]
+    print("بررسی سازگاری:")
+    print("  فایل خراب:", c["corrupt_files"] or "ندارد")
+    print("  رکورد گم‌شده:", c["lost"] or "ندارد")
+    print("  رکورد با داده قدیمی:", c["stale"] or "ندارد")
+    print(
+        "  شناسه تکراری:",
+        {k: v for k, v in c.items() if k.startswith("duplicate_")},
+    )
+    ix = c["indexes"]
+    print("  ایندکس خراب:", ix["corrupt"] or "ندارد")
+    print("  ورودی یتیم در ایندکس:", ix["orphan"] or "ندارد")
+    print("  پایان‌نامه غایب از ایندکس:", ix["missing"] or "ندارد")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="شبیه‌ساز بار هم‌زمان سامانه")
+    parser.add_argument("--students", type=int, default=100)
+    parser.add_argument("--professors", type=int, default=5)
+    parser.add_argument(
+        "--concurrency", type=int, default=32, help="حداکثر دانشجوی هم‌زمان"
+    )
+    parser.add_argument(
+        "--rate", type=float, default=50.0, help="نرخ ورود دانشجو در ثانیه (0 = یکجا)"
+    )
+    parser.add_argument(
+        "--think", type=float, default=0.01, help="میانگین زمان فکر بین مراحل (ثانیه)"
+    )
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument(
+        "--serialize", action="store_true", help="اجرای عملیات پشت یک قفل سراسری"
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keep", action="store_true", help="پوشه موقت پاک نشود")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    report = simulate(args)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+    c = report["consistency"]
+    ix = c["indexes"]
+    failed = c["corrupt_files"] or c["lost"] or c["stale"]
+    return 1 if failed or ix["corrupt"] or ix["orphan"] or ix["missing"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,6 +7,8 @@ import hashlib
 import secrets
 import base64
 import shutil
+import logging
+import threading
 from datetime import datetime, timedelta
 from textwrap import dedent
 
@@ -17,6 +19,10 @@ USERS_FILE = os.path.join(DATA_DIR, "users.json")
 THESES_FILE = os.path.join(DATA_DIR, "theses.json")
 REQUESTS_FILE = os.path.join(DATA_DIR, "requests.json")
 DEFENSES_FILE = os.path.join(DATA_DIR, "defenses.json")
+# تغییرات نمره و پایان‌نامه برای به‌روزرسانی تدریجی analytics (هر خط یک JSON)
+GRADE_CHANGES_FILE = os.path.join(DATA_DIR, "grade_changes.jsonl")
+
+log = logging.getLogger(__name__)
 
 
 def ensure_dirs():
@@ -33,8 +39,11 @@ def load_json(path):
 
 
 def save_json(path, data):
-    with open(path, "w", encoding="utf-8") as f:
+    # نوشتن در فایل موقت و جایگزینی اتمیک: خواننده هیچ‌وقت فایل نیمه‌کاره نمی‌بیند
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
 
 
 def make_password_hash(password: str):
@@ -55,11 +64,23 @@ def verify_password(password: str, stored: str):
         return False
 
 
+def _json_list_empty(path):
+    """آیا فایل JSON یک لیست خالی (یا فقط فاصله) است؟ فقط ابتدای فایل خوانده می‌شود"""
+    if not os.path.exists(path):
+        return True
+    head = b""
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(4096), b""):
+            head += block.translate(None, b" \t\r\n")
+            if len(head) >= 2:
+                break
+    return head == b"" or head.startswith(b"[]")
+
+
 def init_db():
     """چند نمونه مقدار دهی اولیه"""
     ensure_dirs()
-    users = load_json(USERS_FILE)
-    if not users:
+    if _json_list_empty(USERS_FILE):
         # نمونه کاربرها
         users = [
             # دانشجوی نمونه
@@ -162,6 +183,13 @@ def list_requests_for_professor(prof_id, status_filter=None):
     return out
 
 
+def find_request_by_id(rid):
+    for r in load_json(REQUESTS_FILE):
+        if r["id"] == rid:
+            return r
+    return None
+
+
 def update_request(req):
     requests = load_json(REQUESTS_FILE)
     for i, r in enumerate(requests):
@@ -173,6 +201,20 @@ def update_request(req):
     save_json(REQUESTS_FILE, requests)
 
 
+def approve_request(req):
+    req["status"] = "approved"
+    req["approved_at"] = datetime.utcnow().isoformat()
+    update_request(req)
+    return req
+
+
+def reject_request(req, reason):
+    req["status"] = "rejected"
+    req["rejection_reason"] = reason
+    update_request(req)
+    return req
+
+
 def submit_thesis(
     student_id, professor_id, title, abstract, keywords, pdf_path, year, semester
 ):
@@ -184,6 +226,9 @@ def submit_thesis(
     dest_name = f"{uuid.uuid4()}_{os.path.basename(pdf_path)}"
     dest_path = os.path.join(FILES_DIR, dest_name)
     shutil.copy(pdf_path, dest_path)
+    import extraction
+
+    digest = extraction.file_digest(dest_path)
     th = {
         "id": str(uuid.uuid4()),
         "student_id": student_id,
@@ -192,6 +237,7 @@ def submit_thesis(
         "abstract": abstract,
         "keywords": [k.strip() for k in keywords.split(",") if k.strip()],
         "file_path": dest_path,
+        "file_digest": digest,
         "year": year,
         "semester": semester,
         "submitted_at": datetime.utcnow().isoformat(),
@@ -199,31 +245,96 @@ def submit_thesis(
         "grade_numeric": None,
         "grade_letter": None,
     }
+    # ایندکس‌های جانبی قابل بازسازی‌اند؛ خطای آن‌ها نباید ثبت پایان‌نامه را متوقف کند
+    # بررسی شباهت با آرشیو (تشخیص مشابهت/سرقت علمی)
+    th["similar_theses"] = []
+    try:
+        import similarity
+
+        th["similar_theses"] = similarity.check_and_index(th)
+    except Exception:
+        log.exception("similarity check failed for thesis %s", th["id"])
     theses.append(th)
     save_json(THESES_FILE, theses)
+    # به‌روزرسانی مدل پیشنهاد استاد
+    try:
+        import recommend
+
+        recommend.add_thesis(th)
+    except Exception:
+        log.exception("recommender update failed for thesis %s", th["id"])
+    # استخراج متن PDF در پس‌زمینه انجام می‌شود
+    try:
+        extraction.enqueue(th)
+    except Exception:
+        log.exception("text extraction could not be queued for thesis %s", th["id"])
     return th
 
 
 def list_theses():
-    return load_json(THESES_FILE)
+    import extraction
+
+    return extraction.merge_updates(load_json(THESES_FILE))
 
 
 def find_thesis_by_id(tid):
-    for t in load_json(THESES_FILE):
+    for t in list_theses():
         if t["id"] == tid:
             return t
     return None
 
 
+def merge_thesis_fields(updates):
+    """ادغام فیلدهای داده‌شده {شناسه: {فیلد: مقدار}} در نسخه فعلی theses.json
+
+    برای کارهای طولانی که نباید نسخه قدیمی خوانده‌شده در ابتدای کار را ذخیره کنند.
+    """
+    theses = load_json(THESES_FILE)
+    for t in theses:
+        if t["id"] in updates:
+            t.update(updates[t["id"]])
+    save_json(THESES_FILE, theses)
+    return theses
+
+
+def _log_grade_change(rec):
+    with open(GRADE_CHANGES_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+
 def update_thesis(th):
     theses = load_json(THESES_FILE)
     for i, t in enumerate(theses):
         if t["id"] == th["id"]:
             theses[i] = th
-            save_json(THESES_FILE, theses)
-            return
-    theses.append(th)
+            break
+    else:
+        theses.append(th)
     save_json(THESES_FILE, theses)
+    _log_grade_change(
+        {
+            "thesis": th["id"],
+            "year": th.get("year"),
+            "semester": th.get("semester"),
+            "professor_id": th.get("professor_id"),
+        }
+    )
+
+
+def defense_allowed_at(thesis):
+    """زودترین زمان درخواست دفاع (90 روز پس از تایید درخواست اخذ) یا None"""
+    req = next(
+        (
+            r
+            for r in list_requests_for_student(thesis["student_id"])
+            if r["status"] == "approved"
+            and r["professor_id"] == thesis["professor_id"]
+        ),
+        None,
+    )
+    if not req or not req.get("approved_at"):
+        return None
+    return datetime.fromisoformat(req["approved_at"]) + timedelta(days=90)
 
 
 def create_defense_request(
@@ -256,15 +367,44 @@ def list_defense_requests_for_prof(prof_id):
     return [d for d in defenses if d["thesis_id"] in prof_thesis_ids]
 
 
+def find_defense_by_id(did):
+    for d in load_json(DEFENSES_FILE):
+        if d["id"] == did:
+            return d
+    return None
+
+
 def update_defense(d):
     defs_list = load_json(DEFENSES_FILE)
     for i, dd in enumerate(defs_list):
         if dd["id"] == d["id"]:
             defs_list[i] = d
-            save_json(DEFENSES_FILE, defs_list)
-            return
-    defs_list.append(d)
+            break
+    else:
+        defs_list.append(d)
     save_json(DEFENSES_FILE, defs_list)
+    s = d.get("scores")
+    if s:
+        _log_grade_change(
+            {
+                "defense": d["id"],
+                "thesis": d["thesis_id"],
+                "scores": [s["guide"], s["internal"], s["external"]],
+            }
+        )
+
+
+def approve_defense(d):
+    d["status"] = "approved"
+    d["approved_at"] = datetime.utcnow().isoformat()
+    update_defense(d)
+    return d
+
+
+def reject_defense(d):
+    d["status"] = "rejected"
+    update_defense(d)
+    return d
 
 
 def numeric_to_letter(score):
@@ -308,6 +448,48 @@ def generate_minutes(thesis):
     return path
 
 
+def grade_defense(d, g1, g2, g3):
+    """ثبت نمرات سه داور؛ خروجی: (پایان‌نامه یا None، مسیر صورت‌جلسه یا None)"""
+    avg = (g1 + g2 + g3) / 3.0
+    letter = numeric_to_letter(avg)
+    d["scores"] = {
+        "guide": g1,
+        "internal": g2,
+        "external": g3,
+        "avg": avg,
+        "letter": letter,
+    }
+    d["result"] = "defended" if avg >= 10 else "re-defend"
+    update_defense(d)
+    # بروزرسانی پایان‌نامه
+    th = find_thesis_by_id(d["thesis_id"])
+    if not th:
+        return None, None
+    th["grade_numeric"] = round(avg, 2)
+    th["grade_letter"] = letter
+    update_thesis(th)
+    # تولید صورت جلسه
+    return th, generate_minutes(th)
+
+
+def search_theses(query):
+    """جستجو در عنوان، کلیدواژه، نویسنده، سال و متن فایل"""
+    import extraction
+
+    query = query.strip().lower()
+    results = []
+    for t in load_json(THESES_FILE):
+        if (
+            query in t["title"].lower()
+            or query in " ".join(t.get("keywords", [])).lower()
+            or query in t.get("student_id", "").lower()
+            or query in str(t.get("year", "")).lower()
+            or query in extraction.thesis_text(t).lower()
+        ):
+            results.append(t)
+    return results
+
+
 def login_prompt_with_role(role):
     """ورود به حساب کاربری"""
     print("\n\n***********************************************")
@@ -380,14 +562,34 @@ def student_menu(user):
         choice = input("\nانتخاب: ").strip()
         if choice == "1":
             # لیست اساتید و دروس
-            users = load_json(USERS_FILE)
-            profs = [u for u in users if u["role"] == "professor"]
-            print("\n-----------------------------------------------")
-            print("اساتید موجود:\n")
-            for p in profs:
-                print(f"{p['id']} - {p['name']}")
-                for c in p.get("courses", []):
-                    print(f"   course: {c['course_id']} - {c['title']}")
+            topic = input(
+                "موضوع یا کلیدواژه‌ها (Enter برای نمایش همه اساتید): "
+            ).strip()
+            if topic:
+                import recommend
+
+                recs = recommend.recommend_professors(topic)
+                print("\n-----------------------------------------------")
+                if not recs:
+                    print("استاد مرتبطی یافت نشد.")
+                else:
+                    print("اساتید پیشنهادی:\n")
+                for r in recs:
+                    p = r["professor"]
+                    print(
+                        f"{p['id']} - {p['name']} (امتیاز: {r['score']}، ظرفیت: {r['capacity']})"
+                    )
+                    for c in p.get("courses", []):
+                        print(f"   course: {c['course_id']} - {c['title']}")
+            else:
+                users = load_json(USERS_FILE)
+                profs = [u for u in users if u["role"] == "professor"]
+                print("\n-----------------------------------------------")
+                print("اساتید موجود:\n")
+                for p in profs:
+                    print(f"{p['id']} - {p['name']}")
+                    for c in p.get("courses", []):
+                        print(f"   course: {c['course_id']} - {c['title']}")
             pid = input("\nشناسه استاد مورد نظر را وارد کنید: ").strip()
             p = find_user_by_id(pid)
             if not p or p["role"] != "professor":
@@ -505,6 +707,8 @@ def student_menu(user):
                     semester,
                 )
                 print("پایان‌نامه با موفقیت ثبت شد. ID:", th["id"])
+                for m in th.get("similar_theses", []):
+                    print("هشدار شباهت با پایان‌نامه:", m["thesis_id"], "امتیاز:", m["score"])
             except FileNotFoundError as e:
                 print("خطا:", e)
 
@@ -535,19 +739,15 @@ def student_menu(user):
             if not th:
                 print("ID نامعتبر.")
                 continue
-            # پیدا کردن request مربوطه و approved_at
-            req = next(
-                (r for r in reqs if r["professor_id"] == th["professor_id"]), None
-            )
-            if not req or not req.get("approved_at"):
+            allowed_at = defense_allowed_at(th)
+            if allowed_at is None:
                 print("پیش‌نیاز تایید استاد کامل نیست.")
                 continue
-            approved_at = datetime.fromisoformat(req["approved_at"])
-            if datetime.utcnow() < approved_at + timedelta(days=90):
+            if datetime.utcnow() < allowed_at:
                 print(
                     "حداقل 90 روز از تاریخ تایید نگذشته است. فعلاً امکان درخواست دفاع نیست."
                 )
-                print("تاریخ تایید:", req["approved_at"])
+                print("تاریخ مجاز:", allowed_at.isoformat())
                 continue
             # ثبت درخواست دفاع
             print("درخواست دفاع — تاریخ پیشنهادی را به صورت YYYY-MM-DD وارد کنید.")
@@ -564,16 +764,8 @@ def student_menu(user):
         elif choice == "6":
             print("\n-----------------------------------------------")
             # جستجوی پایان‌نامه‌ها
-            query = input("عبارت جستجو (عنوان/نویسنده/کلیدواژه/سال): ").strip().lower()
-            results = []
-            for t in load_json(THESES_FILE):
-                if (
-                    query in t["title"].lower()
-                    or query in " ".join(t.get("keywords", [])).lower()
-                    or query in t.get("student_id", "").lower()
-                    or query in str(t.get("year", "")).lower()
-                ):
-                    results.append(t)
+            query = input("عبارت جستجو (عنوان/نویسنده/کلیدواژه/سال/متن): ").strip().lower()
+            results = search_theses(query)
             if not results:
                 print("نتیجه‌ای یافت نشد.")
             for r in results:
@@ -644,15 +836,11 @@ def professor_menu(user):
             print("1) تایید  2) رد")
             act = input("انتخاب: ").strip()
             if act == "1":
-                sel["status"] = "approved"
-                sel["approved_at"] = datetime.utcnow().isoformat()
-                update_request(sel)
+                approve_request(sel)
                 print("درخواست تایید شد.")
             elif act == "2":
                 reason = input("علت رد را وارد کنید: ").strip()
-                sel["status"] = "rejected"
-                sel["rejection_reason"] = reason
-                update_request(sel)
+                reject_request(sel, reason)
                 print("درخواست رد شد.")
             else:
                 print("بازگشت.")
@@ -679,13 +867,10 @@ def professor_menu(user):
             print("1) تایید  2) رد")
             a = input("انتخاب: ").strip()
             if a == "1":
-                sel["status"] = "approved"
-                sel["approved_at"] = datetime.utcnow().isoformat()
-                update_defense(sel)
+                approve_defense(sel)
                 print("درخواست دفاع تایید شد.")
             elif a == "2":
-                sel["status"] = "rejected"
-                update_defense(sel)
+                reject_defense(sel)
                 print("درخواست دفاع رد شد.")
             else:
                 print("بازگشت.")
@@ -719,40 +904,20 @@ def professor_menu(user):
             except ValueError:
                 print("نمره نامعتبر.")
                 continue
-            avg = (g1 + g2 + g3) / 3.0
-            letter = numeric_to_letter(avg)
-            sel["scores"] = {
-                "guide": g1,
-                "internal": g2,
-                "external": g3,
-                "avg": avg,
-                "letter": letter,
-            }
-            sel["result"] = "defended" if avg >= 10 else "re-defend"
-            update_defense(sel)
-            # بروزرسانی پایان‌نامه
-            th = find_thesis_by_id(sel["thesis_id"])
+            th, minutes_path = grade_defense(sel, g1, g2, g3)
             if th:
-                th["grade_numeric"] = round(avg, 2)
-                th["grade_letter"] = letter
-                update_thesis(th)
-                # تولید صورت جلسه
-                minutes_path = generate_minutes(th)
-                print("نمره ثبت شد. میانگین:", avg, "حرفی:", letter)
+                print(
+                    "نمره ثبت شد. میانگین:",
+                    sel["scores"]["avg"],
+                    "حرفی:",
+                    sel["scores"]["letter"],
+                )
                 print("صورت‌جلسه تولید شد:", minutes_path)
             else:
                 print("پایان‌نامه مرتبط پیدا نشد.")
         elif ch == "4":
-            query = input("عبارت جستجو (عنوان/نویسنده/کلیدواژه/سال): ").strip().lower()
-            results = []
-            for t in load_json(THESES_FILE):
-                if (
-                    query in t["title"].lower()
-                    or query in " ".join(t.get("keywords", [])).lower()
-                    or query in t.get("student_id", "").lower()
-                    or query in str(t.get("year", "")).lower()
-                ):
-                    results.append(t)
+            query = input("عبارت جستجو (عنوان/نویسنده/کلیدواژه/سال/متن): ").strip().lower()
+            results = search_theses(query)
             if not results:
                 print("نتیجه‌ای یافت نشد.")
             for r in results:
@@ -0,0 +1,281 @@
+"""پیشنهاد استاد راهنما بر اساس موضوع (TF-IDF روی پایان‌نامه‌های قبلی)"""
+
+import os
+import re
+import json
+import argparse
+import threading
+
+import numpy as np
+
+from main import (
+    DATA_DIR,
+    USERS_FILE,
+    THESES_FILE,
+    REQUESTS_FILE,
+    load_json,
+    save_json,
+)
+from similarity import normalize_text
+
+
+MATRIX_FILE = os.path.join(DATA_DIR, "tfidf.npz")
+META_FILE = os.path.join(DATA_DIR, "tfidf.json")
+# پایان‌نامه‌های ثبت‌شده پس از آخرین snapshot (هر خط یک JSON)
+DELTA_FILE = os.path.join(DATA_DIR, "tfidf_delta.jsonl")
+COMPACT_BYTES = 1 << 20
+
+_WORD_RE = re.compile(r"\w{2,}")
+
+
+def tokenize(text):
+    return _WORD_RE.findall(normalize_text(text))
+
+
+def thesis_terms(thesis):
+    """کلمات عنوان، کلیدواژه‌ها و چکیده (عنوان و کلیدواژه با وزن بیشتر)"""
+    words = tokenize(thesis.get("title", "")) * 2
+    words += tokenize(" ".join(thesis.get("keywords", []))) * 2
+    words += tokenize(thesis.get("abstract", ""))
+    return words
+
+
+class TfidfModel:
+    """ماتریس تنک استاد × واژه به صورت سه آرایه (سطر، ستون، تعداد)"""
+
+    def __init__(self):
+        self.vocab = {}
+        self.professors = {}
+        self.keys = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.float64)
+        self.df = np.empty(0, dtype=np.int64)
+        self._derived = None
+
+    @staticmethod
+    def _key(rows, cols):
+        return (np.asarray(rows, dtype=np.int64) << 32) | np.asarray(cols, dtype=np.int64)
+
+    def _col(self, term):
+        col = self.vocab.get(term)
+        if col is None:
+            col = self.vocab[term] = len(self.vocab)
+        return col
+
+    def add(self, professor_id, terms):
+        """افزودن تدریجی واژه‌های یک پایان‌نامه به سطر استاد"""
+        self.add_many([(professor_id, terms)])
+
+    def add_many(self, docs):
+        """افزودن دسته‌ای [(شناسه استاد، واژه‌ها)] با یک بار ادغام در ماتریس"""
+        rows, cols = [], []
+        for professor_id, terms in docs:
+            if not terms:
+                continue
+            row = self.professors.setdefault(professor_id, len(self.professors))
+            rows.extend([row] * len(terms))
+            cols.extend(self._col(t) for t in terms)
+        if not rows:
+            return
+        self._derived = None
+        if len(self.df) < len(self.vocab):
+            self.df = np.concatenate(
+                [self.df, np.zeros(len(self.vocab) - len(self.df), dtype=np.int64)]
+            )
+        keys, cnt = np.unique(self._key(rows, cols), return_counts=True)
+        pos = np.searchsorted(self.keys, keys)
+        found = pos < len(self.keys)
+        found[found] = self.keys[pos[found]] == keys[found]
+        self.counts[pos[found]] += cnt[found]
+        new = ~found
+        if new.any():
+            np.add.at(self.df, keys[new] & 0xFFFFFFFF, 1)
+            # کلیدها مرتب‌اند، پس درج در محل searchsorted ترتیب را حفظ می‌کند
+            self.keys = np.insert(self.keys, pos[new], keys[new])
+            self.counts = np.insert(self.counts, pos[new], cnt[new].astype(np.float64))
+
+    def _prepare(self):
+        """محاسبه وزن‌ها، نرم سطرها و ترتیب ستونی (تا تغییر بعدی ماتریس معتبر است)"""
+        n_docs = len(self.professors)
+        idf = np.log((n_docs + 1) / (self.df + 1)) + 1.0
+        rows = self.keys >> 32
+        cols = self.keys & 0xFFFFFFFF
+        weights = (1.0 + np.log(self.counts)) * idf[cols]
+        norms = np.sqrt(np.bincount(rows, weights=weights**2, minlength=n_docs))
+        order = np.argsort(cols, kind="stable")
+        self._derived = {
+            "idf": idf,
+            "norms": np.where(norms > 0, norms, 1.0),
+            "csc_cols": cols[order],
+            "csc_rows": rows[order],
+            "csc_weights": weights[order],
+        }
+
+    def rank(self, text, limit=None):
+        """امتیاز شباهت کسینوسی پرس‌وجو با هر استاد (نزولی)"""
+        n_docs = len(self.professors)
+        q_cols = [self.vocab[t] for t in tokenize(text) if t in self.vocab]
+        if not n_docs or not q_cols:
+            return []
+        if self._derived is None:
+            self._prepare()
+        d = self._derived
+        q_cols, q_cnt = np.unique(q_cols, return_counts=True)
+        q_weights = (1.0 + np.log(q_cnt)) * d["idf"][q_cols]
+        q_weights /= np.linalg.norm(q_weights)
+
+        # فقط ستون‌های واژه‌های پرس‌وجو خوانده می‌شوند
+        lo = np.searchsorted(d["csc_cols"], q_cols, side="left")
+        hi = np.searchsorted(d["csc_cols"], q_cols, side="right")
+        idx = np.concatenate([np.arange(a, b) for a, b in zip(lo, hi)])
+        contrib = d["csc_weights"][idx] * np.repeat(q_weights, hi - lo)
+        scores = np.bincount(d["csc_rows"][idx], weights=contrib, minlength=n_docs)
+        scores /= d["norms"]
+        order = np.argsort(-scores, kind="stable")
+        order = order[scores[order] > 0]
+        ids = sorted(self.professors, key=self.professors.get)
+        out = [(ids[r], float(scores[r])) for r in order]
+        return out[:limit] if limit else out
+
+    def save(self):
+        """ذخیره snapshot (فقط داده‌های پایه؛ آرایه‌های مشتق در حافظه ساخته می‌شوند)"""
+        vocab = sorted(self.vocab, key=self.vocab.get)
+        profs = sorted(self.professors, key=self.professors.get)
+        save_json(META_FILE, {"vocab": vocab, "professors": profs})
+        tmp = f"{MATRIX_FILE}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, keys=self.keys, counts=self.counts, df=self.df)
+        os.replace(tmp, MATRIX_FILE)
+
+    @classmethod
+    def load(cls):
+        model = cls()
+        if not os.path.exists(MATRIX_FILE):
+            return model
+        meta = load_json(META_FILE)
+        model.vocab = {t: i for i, t in enumerate(meta["vocab"])}
+        model.professors = {p: i for i, p in enumerate(meta["professors"])}
+        with np.load(MATRIX_FILE) as z:
+            model.keys, model.counts, model.df = z["keys"], z["counts"], z["df"]
+        return model
+
+
+# مدل کش‌شده در همین پردازه: snapshot تا تغییر mtime آن و خطوط تازه‌ی delta
+_cache = {"stamp": None, "offset": 0, "model": None}
+_cache_lock = threading.RLock()
+
+
+def _stamp():
+    return os.stat(MATRIX_FILE).st_mtime_ns if os.path.exists(MATRIX_FILE) else None
+
+
+def load_model():
+    """مدل به‌روز؛ اگر snapshot وجود نداشته باشد از روی آرشیو ساخته می‌شود"""
+    with _cache_lock:
+        stamp = _stamp()
+        if stamp is None:
+            return rebuild()
+        c = _cache
+        size = os.path.getsize(DELTA_FILE) if os.path.exists(DELTA_FILE) else 0
+        if c["model"] is None or c["stamp"] != stamp or size < c["offset"]:
+            c.update(stamp=stamp, offset=0, model=TfidfModel.load())
+        if size > c["offset"]:
+            with open(DELTA_FILE, "rb") as f:
+                f.seek(c["offset"])
+                data = f.read(size - c["offset"])
+            # فقط خطوط کامل؛ خط نیمه‌کاره در فراخوانی بعدی خوانده می‌شود
+            data = data[: data.rfind(b"\n") + 1]
+            docs = [json.loads(line) for line in data.splitlines() if line.strip()]
+            c["model"].add_many((d["professor_id"], d["terms"]) for d in docs)
+            c["offset"] += len(data)
+        return c["model"]
+
+
+def add_thesis(thesis):
+    """به‌روزرسانی تدریجی مدل پس از ثبت پایان‌نامه (افزودن یک خط به delta)"""
+    with _cache_lock:
+        if _stamp() is None:
+            # آرشیو (شامل همین پایان‌نامه) مبنای اولین snapshot است
+            return rebuild()
+        load_model()
+        line = {"professor_id": thesis["professor_id"], "terms": thesis_terms(thesis)}
+        with open(DELTA_FILE, "ab") as f:
+            f.write((json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8"))
+        model = load_model()
+        if _cache["offset"] > COMPACT_BYTES:
+            _save_snapshot(model)
+        return model
+
+
+def _save_snapshot(model):
+    """ذخیره snapshot و خالی کردن delta"""
+    model.save()
+    with open(DELTA_FILE, "wb"):
+        pass
+    _cache.update(stamp=_stamp(), offset=0, model=model)
+
+
+def rebuild():
+    model = TfidfModel()
+    model.add_many((t["professor_id"], thesis_terms(t)) for t in load_json(THESES_FILE))
+    with _cache_lock:
+        _save_snapshot(model)
+    return model
+
+
+def remaining_capacity(professors):
+    """ظرفیت باقی‌مانده هر استاد (max_supervise منهای درخواست‌های تاییدشده)"""
+    approved = {}
+    for r in load_json(REQUESTS_FILE):
+        if r["status"] == "approved":
+            approved[r["professor_id"]] = approved.get(r["professor_id"], 0) + 1
+    out = {}
+    for p in professors:
+        used = max(p.get("current_supervise", 0), approved.get(p["id"], 0))
+        out[p["id"]] = p.get("max_supervise", 0) - used
+    return out
+
+
+def recommend_professors(topic, limit=10):
+    """اساتید دارای ظرفیت، مرتب‌شده بر اساس شباهت موضوع"""
+    profs = {u["id"]: u for u in load_json(USERS_FILE) if u["role"] == "professor"}
+    capacity = remaining_capacity(profs.values())
+    out = []
+    with _cache_lock:
+        ranked = load_model().rank(topic)
+    for pid, score in ranked:
+        if pid in profs and capacity[pid] > 0:
+            out.append(
+                {
+                    "professor": profs[pid],
+                    "score": round(score, 3),
+                    "capacity": capacity[pid],
+                }
+            )
+            if len(out) == limit:
+                break
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="پیشنهاد استاد راهنما")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("rebuild", help="ساخت مجدد ماتریس از روی آرشیو")
+    p = sub.add_parser("query", help="اساتید مرتبط با یک موضوع")
+    p.add_argument("topic")
+    p.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.cmd == "rebuild":
+        model = rebuild()
+        print("اساتید:", len(model.professors), "واژه‌ها:", len(model.vocab))
+    elif args.cmd == "query":
+        recs = recommend_professors(args.topic, args.limit)
+        if not recs:
+            print("استاد مرتبطی یافت نشد.")
+        for r in recs:
+            p = r["professor"]
+            print(f"{r['score']:.3f}\t{p['id']} - {p['name']}\tظرفیت: {r['capacity']}")
+
+
+if __name__ == "__main__":
+    main()
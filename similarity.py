@@ -0,0 +1,399 @@
+"""تشخیص پایان‌نامه‌های مشابه (MinHash + LSH)"""
+
+import os
+import argparse
+import threading
+from itertools import combinations
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from main import DATA_DIR, THESES_FILE, load_json, merge_thesis_fields
+
+
+SIMILARITY_DIR = os.path.join(DATA_DIR, "minhash")
+SIGNATURES_DIR = os.path.join(SIMILARITY_DIR, "sigs")
+BUCKETS_FILE = os.path.join(SIMILARITY_DIR, "buckets.bin")
+
+SHINGLE_K = 5
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+THRESHOLD = 0.5
+# فشرده‌سازی لاگ سطل‌ها وقتی رکوردهای جایگزین‌شده از رکوردهای معتبر بیشتر شوند
+COMPACT_MIN_RECORDS = 1024
+
+# هش پایه شینگل‌ها به پیمانه 2^31-1 و جایگشت‌ها به پیمانه یک عدد اول بزرگ‌تر از 2^32
+_BASE = 1_000_003
+_BASE_MOD = (1 << 31) - 1
+_PERM_MOD = 4_294_967_311
+_CHUNK = 4096
+_BAND_MUL = 0x9E3779B97F4A7C15
+
+# رکورد لاگ سطل‌ها: شناسه پایان‌نامه، کلید هر باند و اینکه امضا از متن کامل PDF است
+RECORD = np.dtype([("tid", "S64"), ("keys", "<u8", (BANDS,)), ("full", "u1")])
+
+_rng = np.random.default_rng(2024)
+_PERM_A = _rng.integers(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+
+def normalize_text(text):
+    """یکسان‌سازی حروف و فاصله‌ها"""
+    text = (text or "").lower().replace("ي", "ی").replace("ك", "ک")
+    text = text.replace("‌", " ")
+    return " ".join(text.split())
+
+
+def shingle_hashes(text, k=SHINGLE_K):
+    """هش یکتای شینگل‌های k حرفی متن (برداری)"""
+    text = normalize_text(text)
+    if len(text) < k:
+        return np.empty(0, dtype=np.uint64)
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    n = len(codes) - k + 1
+    h = np.zeros(n, dtype=np.uint64)
+    for j in range(k):
+        h = (h * np.uint64(_BASE) + codes[j : j + n]) % np.uint64(_BASE_MOD)
+    return np.unique(h)
+
+
+def minhash_signature(hashes):
+    """امضای MinHash از روی هش شینگل‌ها"""
+    sig = np.full(NUM_PERM, _PERM_MOD, dtype=np.uint64)
+    for start in range(0, len(hashes), _CHUNK):
+        x = hashes[start : start + _CHUNK, None]
+        hv = (x * _PERM_A + _PERM_B) % np.uint64(_PERM_MOD)
+        np.minimum(sig, hv.min(axis=0), out=sig)
+    return sig
+
+
+def thesis_text(thesis):
+    """متنی از پایان‌نامه که برای مقایسه استفاده می‌شود (به همراه متن PDF در صورت وجود)"""
+    import extraction
+
+    parts = (thesis.get("title"), thesis.get("abstract"), extraction.thesis_text(thesis))
+    return " ".join(p for p in parts if p)
+
+
+def has_full_text(thesis):
+    """آیا متن PDF پایان‌نامه استخراج شده و در کش هست؟"""
+    import extraction
+
+    digest = thesis.get("file_digest")
+    path = extraction.cache_path(digest) if digest else None
+    return bool(path) and os.path.exists(path) and os.path.getsize(path) > 0
+
+
+def thesis_signature(thesis):
+    hashes = shingle_hashes(thesis_text(thesis))
+    if not len(hashes):
+        return None
+    return minhash_signature(hashes)
+
+
+def estimate_jaccard(sig_a, sig_b):
+    return float(np.mean(np.asarray(sig_a) == np.asarray(sig_b)))
+
+
+def band_keys(sig):
+    """کلید uint64 هر باند از ترکیب ROWS مقدار امضا"""
+    rows = np.asarray(sig, dtype=np.uint64).reshape(BANDS, ROWS)
+    keys = np.zeros(BANDS, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for r in range(ROWS):
+            keys = keys * np.uint64(_BAND_MUL) + rows[:, r]
+    return keys
+
+
+class LSHIndex:
+    """ایندکس باندی LSH: برای هر باند یک dict از کلید باند به شناسه‌ها
+
+    از روی لاگ سطل‌ها به‌صورت تدریجی ساخته می‌شود؛ اگر برای یک شناسه چند رکورد
+    وجود داشته باشد، آخرین رکورد جای قبلی را در سطل‌ها می‌گیرد.
+    """
+
+    def __init__(self):
+        self.buckets = [{} for _ in range(BANDS)]
+        self.keys = {}
+        self.full = {}
+        self.records = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def superseded(self):
+        """تعداد رکوردهای لاگ که رکورد جدیدتری جایشان را گرفته"""
+        return self.records - len(self.keys)
+
+    def extend(self, records):
+        tids = records["tid"].tolist()
+        keys = records["keys"].tolist()
+        for tid, band, full in zip(tids, keys, records["full"].tolist()):
+            self.add_keys(tid.decode(), band, bool(full))
+        self.records += len(records)
+
+    def add_keys(self, tid, keys, full=False):
+        if tid in self.keys:
+            self.remove(tid)
+        self.keys[tid] = keys
+        self.full[tid] = full
+        for bucket, key in zip(self.buckets, keys):
+            bucket.setdefault(key, []).append(tid)
+
+    def remove(self, tid):
+        keys = self.keys.pop(tid, None)
+        self.full.pop(tid, None)
+        if keys is None:
+            return
+        for bucket, key in zip(self.buckets, keys):
+            ids = bucket.get(key, [])
+            if tid in ids:
+                ids.remove(tid)
+            if not ids:
+                bucket.pop(key, None)
+
+    def candidates(self, sig, exclude=None):
+        """شناسه‌هایی که دست‌کم در یک باند با امضا هم‌سطل‌اند"""
+        out = set()
+        for bucket, key in zip(self.buckets, band_keys(sig).tolist()):
+            out.update(bucket.get(key, ()))
+        out.discard(exclude)
+        return out
+
+    def query(self, sig, threshold=THRESHOLD, exclude=None):
+        """کاندیداهای مشابه به همراه تخمین ضریب جاکارد (نزولی)؛ فقط امضای کاندیداها خوانده می‌شود"""
+        ids, sigs = [], []
+        for tid in sorted(self.candidates(sig, exclude)):
+            other = read_signature(tid)
+            if other is not None:
+                ids.append(tid)
+                sigs.append(other)
+        if not ids:
+            return []
+        scores = (np.stack(sigs) == np.asarray(sig, dtype=np.uint64)).mean(axis=1)
+        out = [
+            {"thesis_id": tid, "score": round(float(s), 3)}
+            for tid, s in zip(ids, scores)
+            if s >= threshold
+        ]
+        out.sort(key=lambda m: m["score"], reverse=True)
+        return out
+
+
+# کش ایندکس در همین پردازه: فقط رکوردهای تازه‌ی لاگ سطل‌ها خوانده می‌شوند
+_cache = {"path": None, "ino": None, "offset": 0, "index": None}
+_cache_lock = threading.RLock()
+
+
+def _signature_path(tid):
+    return os.path.join(SIGNATURES_DIR, f"{tid}.sig")
+
+
+def read_signature(tid):
+    path = _signature_path(tid)
+    if not os.path.exists(path):
+        return None
+    sig = np.fromfile(path, dtype=np.uint64)
+    return sig if len(sig) == NUM_PERM else None
+
+
+def _write_signature(tid, sig):
+    os.makedirs(SIGNATURES_DIR, exist_ok=True)
+    path = _signature_path(tid)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    np.asarray(sig, dtype=np.uint64).tofile(tmp)
+    os.replace(tmp, path)
+
+
+def _records(items):
+    """[(شناسه، امضا، متن کامل؟)] -> آرایه رکوردهای لاگ سطل‌ها"""
+    recs = np.zeros(len(items), dtype=RECORD)
+    for i, (tid, sig, full) in enumerate(items):
+        recs[i]["tid"] = tid.encode()
+        recs[i]["keys"] = band_keys(sig)
+        recs[i]["full"] = full
+    return recs
+
+
+def load_index():
+    """ایندکس کش‌شده، به‌روز با رکوردهایی که از آخرین بار به لاگ اضافه شده‌اند"""
+    path = os.path.abspath(BUCKETS_FILE)
+    with _cache_lock:
+        st = os.stat(path) if os.path.exists(path) else None
+        c = _cache
+        if (
+            c["index"] is None
+            or c["path"] != path
+            or st is None
+            or st.st_ino != c["ino"]
+            or st.st_size < c["offset"]
+        ):
+            c.update(path=path, ino=st and st.st_ino, offset=0, index=LSHIndex())
+        if st is not None and st.st_size - c["offset"] >= RECORD.itemsize:
+            n = (st.st_size - c["offset"]) // RECORD.itemsize
+            with open(path, "rb") as f:
+                f.seek(c["offset"])
+                c["index"].extend(np.fromfile(f, dtype=RECORD, count=n))
+            c["offset"] += n * RECORD.itemsize
+        return c["index"]
+
+
+def store_signature(tid, sig, full=False):
+    """ذخیره امضا و افزودن یک رکورد به انتهای لاگ سطل‌ها (در یک write)"""
+    _write_signature(tid, sig)
+    os.makedirs(SIMILARITY_DIR, exist_ok=True)
+    with open(BUCKETS_FILE, "ab") as f:
+        f.write(_records([(tid, sig, full)]).tobytes())
+    with _cache_lock:
+        index = load_index()
+        if index.superseded > max(COMPACT_MIN_RECORDS, len(index)):
+            compact()
+
+
+def compact():
+    """بازنویسی لاگ سطل‌ها فقط با آخرین رکورد هر شناسه"""
+    with _cache_lock:
+        index = load_index()
+        recs = np.zeros(len(index), dtype=RECORD)
+        for i, (tid, keys) in enumerate(index.keys.items()):
+            recs[i]["tid"] = tid.encode()
+            recs[i]["keys"] = keys
+            recs[i]["full"] = index.full[tid]
+        tmp = f"{BUCKETS_FILE}.{os.getpid()}.tmp"
+        recs.tofile(tmp)
+        with open(BUCKETS_FILE, "rb") as old:
+            os.replace(tmp, BUCKETS_FILE)
+            # رکوردهایی که پردازه‌های دیگر همین حالا به فایل قبلی اضافه کرده‌اند
+            old.seek(_cache["offset"])
+            tail = old.read()
+        tail = tail[: len(tail) - len(tail) % RECORD.itemsize]
+        if tail:
+            with open(BUCKETS_FILE, "ab") as f:
+                f.write(tail)
+        _cache["index"] = None
+        return load_index()
+
+
+def check_and_index(thesis, threshold=THRESHOLD):
+    """بررسی شباهت پایان‌نامه با آرشیو و افزودن (یا جایگزینی) آن در ایندکس
+
+    امضا همیشه از عنوان + چکیده + متن PDF (اگر در کش باشد) ساخته می‌شود؛
+    امضاهایی که بدون متن PDF ساخته شده‌اند پس از استخراج دوباره ساخته می‌شوند.
+    """
+    full = has_full_text(thesis)
+    sig = thesis_signature(thesis)
+    if sig is None:
+        return []
+    # نخ‌های دیگر ممکن است هم‌زمان ایندکس کش‌شده را به‌روز کنند
+    with _cache_lock:
+        matches = load_index().query(sig, threshold, exclude=thesis["id"])
+    store_signature(thesis["id"], sig, full)
+    return matches
+
+
+def _signatures_chunk(theses):
+    out = []
+    for t in theses:
+        full = has_full_text(t)
+        sig = thesis_signature(t)
+        if sig is not None:
+            out.append((t["id"], sig, full))
+    return out
+
+
+def _write_index(items):
+    """بازنویسی کامل امضاها و لاگ سطل‌ها؛ items: [(شناسه، امضا، متن کامل؟)]"""
+    os.makedirs(SIGNATURES_DIR, exist_ok=True)
+    ids = set()
+    for tid, sig, _ in items:
+        _write_signature(tid, sig)
+        ids.add(tid)
+    for name in os.listdir(SIGNATURES_DIR):
+        if name.endswith(".sig") and name[:-4] not in ids:
+            os.remove(os.path.join(SIGNATURES_DIR, name))
+    tmp = f"{BUCKETS_FILE}.{os.getpid()}.tmp"
+    _records(items).tofile(tmp)
+    os.replace(tmp, BUCKETS_FILE)
+
+
+def _candidate_pairs(keys):
+    """جفت سطرهایی که دست‌کم در یک باند کلید یکسان دارند (با مرتب‌سازی هر ستون)"""
+    pairs = set()
+    for b in range(BANDS):
+        order = np.argsort(keys[:, b], kind="stable")
+        col = keys[order, b]
+        starts = np.flatnonzero(np.r_[True, col[1:] != col[:-1]])
+        sizes = np.diff(np.r_[starts, len(col)])
+        for s, n in zip(starts[sizes > 1].tolist(), sizes[sizes > 1].tolist()):
+            pairs.update(combinations(sorted(order[s : s + n].tolist()), 2))
+    return pairs
+
+
+def rescore_archive(threshold=THRESHOLD, workers=None, chunk_size=256):
+    """بازسازی کامل امضاها با چند پردازه و امتیازدهی مجدد کل آرشیو"""
+    theses = load_json(THESES_FILE)
+    chunks = [theses[i : i + chunk_size] for i in range(0, len(theses), chunk_size)]
+    items = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for part in pool.map(_signatures_chunk, chunks):
+            items.extend(part)
+    _write_index(items)
+    with _cache_lock:
+        _cache["index"] = None
+
+    ids = [item[0] for item in items]
+    matches = {tid: [] for tid in ids}
+    pairs = []
+    if items:
+        sigs = np.stack([item[1] for item in items])
+        keys = _records(items)["keys"]
+        rows = np.array(sorted(_candidate_pairs(keys)), dtype=np.int64)
+        if len(rows):
+            scores = (sigs[rows[:, 0]] == sigs[rows[:, 1]]).mean(axis=1)
+            for (i, j), s in zip(rows.tolist(), scores.tolist()):
+                if s < threshold:
+                    continue
+                s = round(s, 3)
+                matches[ids[i]].append({"thesis_id": ids[j], "score": s})
+                matches[ids[j]].append({"thesis_id": ids[i], "score": s})
+                a, b = sorted((ids[i], ids[j]))
+                pairs.append((a, b, s))
+    # theses.json دوباره خوانده می‌شود تا تغییرات حین امتیازدهی از بین نرود
+    merge_thesis_fields(
+        {
+            t["id"]: {
+                "similar_theses": sorted(
+                    matches.get(t["id"], []), key=lambda m: m["score"], reverse=True
+                )
+            }
+            for t in theses
+        }
+    )
+    import extraction
+
+    extraction.drop_updates([t["id"] for t in theses])
+    pairs.sort(key=lambda p: p[2], reverse=True)
+    return pairs
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="تشخیص پایان‌نامه‌های مشابه")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("rescore", help="امتیازدهی مجدد کل آرشیو")
+    p.add_argument("--threshold", type=float, default=THRESHOLD)
+    p.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.cmd == "rescore":
+        pairs = rescore_archive(args.threshold, args.workers)
+        if not pairs:
+            print("مورد مشابهی یافت نشد.")
+        for a, b, score in pairs:
+            print(f"{score:.3f}\t{a}\t{b}")
+
+
+if __name__ == "__main__":
+    main()
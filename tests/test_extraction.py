@@ -0,0 +1,46 @@
+import zlib
+
+import extraction
+
+
+def _pdf(
+    tmp_path, resources, content=b"BT /F1 12 Tf 72 700 Td (Hello thesis world) Tj ET"
+):
+    comp = zlib.compress(content)
+    parts = [
+        b"%PDF-1.4\n",
+        b"1 0 obj\n<< /Type /Catalog /Pages 2 0 R >>\nendobj\n",
+        b"2 0 obj\n<< /Type /Pages /Kids [3 0 R] /Count 1 >>\nendobj\n",
+        b"3 0 obj\n<< /Type /Page /Parent 2 0 R /Contents 4 0 R",
+        b" /Resources << " + resources + b" >> >>\nendobj\n",
+        b"4 0 obj\n<< /Length " + str(len(comp)).encode(),
+        b" /Filter /FlateDecode >>\nstream\n" + comp + b"\nendstream\nendobj\n",
+        b"%%EOF\n",
+    ]
+    path = tmp_path / "thesis.pdf"
+    path.write_bytes(b"".join(parts))
+    return str(path)
+
+
+def test_pdf_text_with_image_procset(tmp_path):
+    # /ImageB در ProcSet صفحه نباید stream محتوا را تصویر فرض کند
+    path = _pdf(tmp_path, b"/ProcSet [/PDF /Text /ImageB /ImageC /ImageI]")
+    assert extraction.pdf_text(path) == "Hello thesis world"
+
+
+def test_pdf_text_without_procset(tmp_path):
+    path = _pdf(tmp_path, b"/Font << /F1 5 0 R >>")
+    assert extraction.pdf_text(path) == "Hello thesis world"
+
+
+def test_pdf_text_skips_image_stream(tmp_path):
+    comp = zlib.compress(b"BT (not text) Tj ET")
+    path = tmp_path / "image.pdf"
+    path.write_bytes(
+        b"%PDF-1.4\n1 0 obj\n<< /Type /XObject /Subtype /Image /Length "
+        + str(len(comp)).encode()
+        + b" /Filter /FlateDecode >>\nstream\n"
+        + comp
+        + b"\nendstream\nendobj\n%%EOF\n"
+    )
+    assert extraction.pdf_text(str(path)) == ""